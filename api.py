@@ -4,51 +4,32 @@ import json
 from requests import post, get
 import requests
 from dotenv import load_dotenv
-import os
 from PIL import Image
+from auth import TokenManager
+from http_client import getExecutor, getSession
 from generate_poster import generatePoster
 
 load_dotenv()
 
+# One cached access token for the whole run
+token_manager = TokenManager("https://accounts.spotify.com/api/token", 'CLIENT_ID', 'CLIENT_SECRET', session=getSession())
 
-def getToken():
-    auth_string = os.getenv('CLIENT_ID') + ":" + os.getenv('CLIENT_SECRET')
-    auth_bytes = auth_string.encode("utf-8")
-    auth_base64 = str(base64.b64encode(auth_bytes), "utf-8")
-
-    url = "https://accounts.spotify.com/api/token"
-
-    headers = {
-        "Authorization": "Basic " + auth_base64,
-        "Content-Type": "application/x-www-form-urlencoded"
-    }
 
-    data = {"grant_type": "client_credentials"}
-    result = post(url, headers=headers, data=data)
-
-    if result.status_code == 200:
-        json_result = result.json()
-        token = json_result['access_token']
-        return token
-    else:
-        # Print the entire result for debugging
-        print(f"Error: {result.status_code}")
-        print(f"result: {result.text}")
-        result.raise_for_status()
+def getToken():
+    return token_manager.getToken()
 
 
 def getAuthHeader(token):
     return {"Authorization": "Bearer " + token}
 
 
-def search(token, type, input, limit):
+def search(type, input, limit):
     url = 'https://api.spotify.com/v1/search'
-    headers = getAuthHeader(token)
     query = f"?q={input}&type={type}&limit={limit}"
 
     query_url = url+query
 
-    result = get(query_url, headers=headers)
+    result = token_manager.authorizedGet(query_url)
     if result.status_code == 200:
         json_result = result.json()[type+'s']['items']
         if len(json_result) == 0:
@@ -68,7 +49,7 @@ def getImages(search_result):
     for result in search_result:
         image_url = result['images'][0]['url']
 
-        response = requests.get(image_url)
+        response = getSession().get(image_url)
 
         if response.status_code == 200:
             image_data = BytesIO(response.content)
@@ -97,34 +78,47 @@ def getArtistNames(search_result):
     return artists
 
 
-def getAlbumInfo(token, search_result):
-    tracklists = []
-    copyrightslist = []
+def getAlbumsChunk(ids):
+    """Fetch up to 20 albums with one request and return {id: {'tracklist', 'copyright'}}."""
+    url = f"https://api.spotify.com/v1/albums?ids={','.join(ids)}"
+    response = token_manager.authorizedGet(url)
+
+    albums = {}
+    if response.status_code == 200:
+        for album in response.json()['albums']:
+            # Unknown ids come back as null
+            if album is None:
+                continue
+            albums[album['id']] = {
+                'tracklist': [song['name'] for song in album['tracks']['items']],
+                'copyright': album['copyrights'][0]['text'] if album['copyrights'] else '',
+            }
+    else:
+        # Print the entire result for debugging
+        print(f"Error: {response.status_code}")
+        print(f"result: {response.text}")
 
-    for result in search_result:
-        id = result['id']
-        url = f"https://api.spotify.com/v1/albums/{id}"
-        headers = getAuthHeader(token)
-        response = get(url, headers=headers)
+    return albums
 
-        songlist = []
-        if response.status_code == 200:
-            # extract the list of songs
-            album = response.json()['tracks']['items']
-            for song in album:
-                songlist.append(song['name'])
 
-            # extract the copyright text
-            copyrights = response.json()['copyrights']
-            copyright_text = copyrights[0]['text']
+def getAlbumsBatch(ids):
+    """Return {id: {'tracklist', 'copyright'}} using the multi-album endpoint, 20 ids per concurrent request."""
+    chunks = [ids[i:i + 20] for i in range(0, len(ids), 20)]
+    albums = {}
+    for chunk_albums in getExecutor().map(getAlbumsChunk, chunks):
+        albums.update(chunk_albums)
+    return albums
 
-        else:
-            # Print the entire result for debugging
-            print(f"Error: {response.status_code}")
-            print(f"result: {response.text}")
 
-        tracklists.append(songlist)
-        copyrightslist.append(copyright_text)
+def getAlbumInfo(search_result):
+    albums = getAlbumsBatch([result['id'] for result in search_result])
+
+    tracklists = []
+    copyrightslist = []
+    for result in search_result:
+        album = albums.get(result['id'], {'tracklist': [], 'copyright': ''})
+        tracklists.append(album['tracklist'])
+        copyrightslist.append(album['copyright'])
 
     album_info = {'tracklists': tracklists, 'copyrights': copyrightslist}
 
@@ -155,7 +149,7 @@ def getScannables(search_result, bg_color: str):
     for result in search_result:
         spotify_uri = result['uri']
         url = f"https://scannables.scdn.co/uri/plain/{format}/{bg_color}/{code_color}/{size}/{spotify_uri}"
-        response = requests.get(url)
+        response = getSession().get(url)
         
         if response.status_code == 200:
             img = Image.open(BytesIO(response.content))
@@ -172,12 +166,11 @@ bg_color = 'DED8CE'  # white background
 
 
 
-token = getToken()
-search_result = search(token, 'album', "dua lipa", limit=5)
+search_result = search('album', "dua lipa", limit=5)
 images = getImages(search_result)
 albums = getAlbumNames(search_result)
 artists = getArtistNames(search_result)
-album_info = getAlbumInfo(token, search_result)
+album_info = getAlbumInfo(search_result)
 tracklists = album_info['tracklists']
 copyrights = album_info['copyrights']
 scannables = getScannables(search_result, bg_color)
@@ -1,9 +1,20 @@
 # Using flask to make an api 
 # import necessary libraries and functions 
 from flask import Flask, jsonify, request, send_file
-from search import getSearchResultAsJson, getAlbumInfo
-from poster import generatePoster
+from search import getSearchResult, getAlbumInfo, getPosterAssets, fetchAlbums, isAlbumId, album_cache, search_cache
+from scannables import fetchScannable, scannable_cache
+from covers import fetchCover, cover_cache
+from http_client import getExecutor
+from serialize import RecordJSONProvider
+from poster import DEFAULT_BG_COLOR
+from encoders import extension, mimetype, outputError, outputOptions
+from layout import DEFAULT_LAYOUT, layoutError
+from render_cache import RenderCache, renderKey
+from render_pool import RenderPool, RenderPoolFull, RenderTimeout
+from zip_stream import ZipStream
 import json
+import os
+import time
 from io import BytesIO
 from flask_cors import CORS
 from PIL import Image, ImageDraw, ImageFont
@@ -12,7 +23,17 @@ import base64
   
 # creating a Flask app 
 app = Flask(__name__) 
+app.json = RecordJSONProvider(app)
 # CORS(app)
+
+# Encoded posters keyed by a hash of their inputs
+render_cache = RenderCache()
+
+# Renders run in separate processes so they use every core and can be bounded and timed out
+render_pool = RenderPool()
+
+# Most albums one /posters archive may ask for
+MAX_ZIP_ALBUMS = int(os.getenv('MAX_ZIP_ALBUMS', 500))
   
 # on the terminal type: curl http://127.0.0.1:5000/ 
 # returns hello world when we use GET. 
@@ -34,48 +55,243 @@ def search():
     if request_type == 'search':
         query = request.args.get('query')
         quantity = request.args.get('quantity')
-        json_result = getSearchResultAsJson(query, quantity)
-        return json_result
+        return jsonify(getSearchResult(query, quantity))
 
     elif request_type == 'get-info':
         id = request.args.get('id')
         print(id)
-        json_result = getAlbumInfo(id)
-        return json_result
+        return jsonify(getAlbumInfo(id))
 
     else:
         print(json.dumps({"error": "Valid type, invalid args."}))
 
 
-@app.route('/poster', methods=['POST'])
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify({
+        'renders': render_cache.stats(),
+        'render_pool': render_pool.stats(),
+        # Fonts, decoded covers, text measurements and session layers live in the render processes
+        'render_workers': render_pool.workerStats(),
+        'albums': album_cache.stats(),
+        'searches': search_cache.stats(),
+        'scannables': scannable_cache.stats(),
+        'covers': cover_cache.stats(),
+    })
+
+
+def readPosterInputs():
+    """Return the text fields and the encoded cover/scannable bytes of a /poster request.
+
+    multipart/form-data uploads carry 'image' and 'scannable' file parts, with the
+    tracklist as a JSON array; the JSON body with base64 images is still accepted.
+    """
+    if request.mimetype == 'multipart/form-data':
+        data = request.form.to_dict()
+        data['tracklist'] = json.loads(data.get('tracklist') or '[]')
+        image = request.files['image'].read()
+        scannable = request.files['scannable'].read()
+    else:
+        data = request.json
+        image = base64.b64decode(data.get('image'))
+        scannable = base64.b64decode(data.get('scannable'))
+
+    fields = {
+        'album_name': data.get('album_name'),
+        'artist_name': data.get('artist_name'),
+        'tracklist': data.get('tracklist'),
+        'copyright_text': data.get('copyright_text'),
+        'bg_color': DEFAULT_BG_COLOR,
+        # Previews render at a fraction of the print resolution
+        **readOutputOptions(data),
+    }
+    return fields, image, scannable
+
+
+def readOutputOptions(data=None):
+    """Return the quality tier, format, encoder profile and page layout from the query string or request body."""
+    data = data or {}
+    return {
+        **outputOptions(request.args.get('quality') or data.get('quality'),
+                        request.args.get('format') or data.get('format'),
+                        request.args.get('profile') or data.get('profile')),
+        'layout': request.args.get('layout') or data.get('layout') or DEFAULT_LAYOUT,
+    }
+
+
+def readAlbumInputs(album_id):
+    """Resolve an album server-side and return its fields and downloaded images, or None."""
+    assets = getPosterAssets(album_id, DEFAULT_BG_COLOR)
+    if assets is None:
+        return None
+    album, cover_bytes, scannable_bytes = assets
+    return albumFields(album, readOutputOptions()), cover_bytes, scannable_bytes
+
+
+def albumFields(album, options):
+    """Return the render fields for an album record."""
+    return {
+        'album_name': album.name,
+        'artist_name': album.artist_name,
+        'tracklist': album.tracklist,
+        'copyright_text': album.copyright,
+        'bg_color': DEFAULT_BG_COLOR,
+        **options,
+    }
+
+
+@app.route('/poster', methods=['GET', 'POST'])
 def generate():
     try:
-        # Get parameters from request
-        data = request.json
-        album_name = data.get('album_name')
-        artist_name = data.get('artist_name')
-        tracklist = data.get('tracklist')
-        copyright_text = data.get('copyright_text')
-        scannable = Image.open(BytesIO(base64.b64decode(data.get('scannable'))))
-        image = Image.open(BytesIO(base64.b64decode(data.get('image'))))
-        bg_color = 'DED8CE'
-
-        # Generate the poster
-        poster_bytes = generatePoster(bg_color, image, album_name, artist_name, tracklist, scannable, copyright_text)
-
-        # Create BytesIO object from the poster bytes
-        img_io = BytesIO(poster_bytes)
-        img_io.seek(0)
-        
+        # Get parameters from request, or fetch everything ourselves given just an album id
+        album_id = request.args.get('album_id')
+        if album_id:
+            inputs = readAlbumInputs(album_id)
+            if inputs is None:
+                return jsonify({'error': {'message': 'No results found.', 'query': album_id}}), 404
+        elif request.method == 'GET':
+            return jsonify({'error': 'No album_id specified.'}), 400
+        else:
+            inputs = readPosterInputs()
+        fields, image_bytes, scannable_bytes = inputs
+        error = outputError(fields) or layoutError(fields['layout'])
+        if error:
+            return error, 400
+
+        # Identical inputs always render to identical bytes, so the hash doubles as the ETag
+        key = renderKey(fields, image_bytes, scannable_bytes)
+        if request.if_none_match.contains(key):
+            response = app.response_class(status=304)
+            response.set_etag(key)
+            return response
+
+        poster_bytes = render_cache.get(key)
+        if poster_bytes is None:
+            # Generate the poster in the render pool, shedding load once it is saturated
+            # Within an editing session, the worker redraws only the layers that changed since its last render
+            try:
+                poster_bytes = render_pool.render(fields, image_bytes, scannable_bytes, request.args.get('session'))
+            except RenderPoolFull as e:
+                response = jsonify({'error': str(e)})
+                response.status_code = 503
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response
+            except RenderTimeout as e:
+                return jsonify({'error': str(e)}), 504
+            render_cache.put(key, poster_bytes)
+
         # Return the image using send_file
         return send_file(
-            img_io,
-            mimetype='image/jpeg',  # Adjust mimetype based on your image format
-            as_attachment=False
+            BytesIO(poster_bytes),
+            mimetype=mimetype(fields['format']),
+            as_attachment=False,
+            etag=key
         )
     
     except Exception as e:
         return str(e), 400
+
+
+def startAlbumPoster(album, options):
+    """Download an album's images and queue its render.
+
+    Returns (key, poster) where poster is the cached bytes or a render pool future.
+    """
+    cover = getExecutor().submit(fetchCover, album.cover_url)
+    scannable_bytes = fetchScannable(album.id, DEFAULT_BG_COLOR)
+    cover_bytes = cover.result()
+    fields = albumFields(album, options)
+    key = renderKey(fields, cover_bytes, scannable_bytes)
+    poster_bytes = render_cache.get(key)
+    if poster_bytes is not None:
+        return key, poster_bytes
+    while True:
+        try:
+            return key, render_pool.submit(fields, cover_bytes, scannable_bytes)
+        except RenderPoolFull as e:
+            # The archive is already streaming, so wait for room rather than failing
+            time.sleep(e.retry_after)
+
+
+def finishAlbumPoster(key, poster):
+    if isinstance(poster, bytes):
+        return poster
+    poster_bytes = render_pool.result(poster)
+    render_cache.put(key, poster_bytes)
+    return poster_bytes
+
+
+def streamPosterZip(ids, albums, options, errors=None):
+    """Yield a ZIP of posters, one member per album, as each render finishes.
+
+    The next album is downloaded and queued while the current one renders, so
+    at most two posters are in memory at a time. errors maps ids that could
+    not be looked up to the reason, which goes into errors.txt.
+    """
+    archive = ZipStream()
+    failures = []
+    errors = errors or {}
+
+    def start(id):
+        if id not in albums:
+            failures.append(f"{id}: {errors.get(id, 'No results found.')}")
+            return None
+        try:
+            return id, startAlbumPoster(albums[id], options)
+        except Exception as e:
+            failures.append(f"{id}: {e}")
+            return None
+
+    def finish(started):
+        id, (key, poster) = started
+        try:
+            return archive.add(f"{id}.{extension(options['format'])}", finishAlbumPoster(key, poster))
+        except Exception as e:
+            failures.append(f"{id}: {e}")
+            return b''
+
+    current = None
+    for id in ids:
+        upcoming = start(id)
+        if current is not None:
+            yield finish(current)
+        current = upcoming
+    if current is not None:
+        yield finish(current)
+
+    if failures:
+        yield archive.add('errors.txt', '\n'.join(failures) + '\n')
+    yield archive.close()
+
+
+@app.route('/posters', methods=['GET', 'POST'])
+def generateZip():
+    if request.method == 'POST':
+        data = request.json or {}
+        ids = data.get('album_ids') or []
+        options = readOutputOptions(data)
+    else:
+        ids = [id for id in (request.args.get('album_ids') or '').split(',') if id]
+        options = readOutputOptions()
+    ids = list(dict.fromkeys(ids))
+
+    if not ids:
+        return jsonify({'error': 'No album_ids specified.'}), 400
+    if len(ids) > MAX_ZIP_ALBUMS:
+        return jsonify({'error': f"At most {MAX_ZIP_ALBUMS} albums per archive."}), 400
+    error = outputError(options) or layoutError(options['layout'])
+    if error:
+        return error, 400
+
+    # Records are small, so they are all looked up before the archive starts streaming.
+    # Malformed ids would fail their whole upstream chunk, so they are never sent
+    errors = {id: 'Invalid album id.' for id in ids if not isAlbumId(id)}
+    albums = fetchAlbums([id for id in ids if id not in errors], errors)
+    return app.response_class(
+        streamPosterZip(ids, albums, options, errors),
+        mimetype='application/zip',
+        headers={'Content-Disposition': 'attachment; filename="posters.zip"'},
+    )
   
 
   
@@ -0,0 +1,163 @@
+# Asyncio-native variant of app.py with the same /search and /poster contract.
+# Run with an ASGI server, e.g.: uvicorn asgi_app:app --port $PORT
+import base64
+import json
+
+from quart import Quart, Response, jsonify, request
+
+import async_search
+from encoders import mimetype, outputError, outputOptions
+from layout import DEFAULT_LAYOUT, layoutError
+from poster import DEFAULT_BG_COLOR
+from render_cache import RenderCache, renderKey
+from render_pool import RenderPool, RenderPoolFull, RenderTimeout
+from covers import cover_cache
+from scannables import scannable_cache
+from search import album_cache, search_cache
+from serialize import RecordJSONProvider
+
+app = Quart(__name__)
+app.json = RecordJSONProvider(app)
+
+render_cache = RenderCache()
+# Renders are CPU-bound, so they run in worker processes instead of on the event loop
+render_pool = RenderPool()
+
+
+@app.before_serving
+async def startup():
+    await async_search.startClient()
+
+
+@app.after_serving
+async def shutdown():
+    await async_search.closeClient()
+
+
+@app.route('/', methods=['GET', 'POST'])
+async def home():
+    return jsonify({'data': "hello world"})
+
+
+@app.route('/search', methods=['GET'])
+async def search():
+    request_type = request.args.get('type')
+    if not request_type:
+        return jsonify({'error': 'No type specified.'})
+
+    if request_type == 'search':
+        query = request.args.get('query')
+        quantity = request.args.get('quantity')
+        return jsonify(await async_search.getSearchResult(query, quantity))
+
+    elif request_type == 'get-info':
+        return jsonify(await async_search.getAlbumInfo(request.args.get('id')))
+
+    return jsonify({"error": "Valid type, invalid args."}), 400
+
+
+@app.route('/stats', methods=['GET'])
+async def stats():
+    return jsonify({
+        'renders': render_cache.stats(),
+        'render_pool': render_pool.stats(),
+        # Fonts, decoded covers, text measurements and session layers live in the render processes
+        'render_workers': render_pool.workerStats(),
+        'albums': album_cache.stats(),
+        'searches': search_cache.stats(),
+        'scannables': scannable_cache.stats(),
+        'covers': cover_cache.stats(),
+    })
+
+
+async def readPosterInputs():
+    """Async version of app.readPosterInputs: multipart parts or base64 JSON."""
+    if request.mimetype == 'multipart/form-data':
+        data = (await request.form).to_dict()
+        data['tracklist'] = json.loads(data.get('tracklist') or '[]')
+        files = await request.files
+        image = files['image'].read()
+        scannable = files['scannable'].read()
+    else:
+        data = await request.get_json()
+        image = base64.b64decode(data.get('image'))
+        scannable = base64.b64decode(data.get('scannable'))
+
+    fields = {
+        'album_name': data.get('album_name'),
+        'artist_name': data.get('artist_name'),
+        'tracklist': data.get('tracklist'),
+        'copyright_text': data.get('copyright_text'),
+        'bg_color': DEFAULT_BG_COLOR,
+        **readOutputOptions(data),
+    }
+    return fields, image, scannable
+
+
+def readOutputOptions(data=None):
+    data = data or {}
+    return {
+        **outputOptions(request.args.get('quality') or data.get('quality'),
+                        request.args.get('format') or data.get('format'),
+                        request.args.get('profile') or data.get('profile')),
+        'layout': request.args.get('layout') or data.get('layout') or DEFAULT_LAYOUT,
+    }
+
+
+async def readAlbumInputs(album_id):
+    assets = await async_search.getPosterAssets(album_id, DEFAULT_BG_COLOR)
+    if assets is None:
+        return None
+    album, cover_bytes, scannable_bytes = assets
+
+    fields = {
+        'album_name': album.name,
+        'artist_name': album.artist_name,
+        'tracklist': album.tracklist,
+        'copyright_text': album.copyright,
+        'bg_color': DEFAULT_BG_COLOR,
+        **readOutputOptions(),
+    }
+    return fields, cover_bytes, scannable_bytes
+
+
+@app.route('/poster', methods=['GET', 'POST'])
+async def generate():
+    try:
+        album_id = request.args.get('album_id')
+        if album_id:
+            inputs = await readAlbumInputs(album_id)
+            if inputs is None:
+                return jsonify({'error': {'message': 'No results found.', 'query': album_id}}), 404
+        elif request.method == 'GET':
+            return jsonify({'error': 'No album_id specified.'}), 400
+        else:
+            inputs = await readPosterInputs()
+        fields, image_bytes, scannable_bytes = inputs
+        error = outputError(fields) or layoutError(fields['layout'])
+        if error:
+            return error, 400
+
+        key = renderKey(fields, image_bytes, scannable_bytes)
+        if request.if_none_match.contains(key):
+            response = Response('', status=304)
+            response.set_etag(key)
+            return response
+
+        poster_bytes = render_cache.get(key)
+        if poster_bytes is None:
+            try:
+                future = render_pool.submit(fields, image_bytes, scannable_bytes, request.args.get('session'))
+                poster_bytes = await render_pool.awaitResult(future)
+            except RenderPoolFull as e:
+                return jsonify({'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
+            except RenderTimeout as e:
+                return jsonify({'error': str(e)}), 504
+            render_cache.put(key, poster_bytes)
+
+        response = Response(poster_bytes, mimetype=mimetype(fields['format']))
+        response.set_etag(key)
+        return response
+
+    except Exception as e:
+        return str(e), 400
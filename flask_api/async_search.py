@@ -0,0 +1,226 @@
+# Asyncio counterparts of search.py for asgi_app.py. Records and caches are
+# shared with search.py; only the upstream I/O differs.
+import asyncio
+import base64
+import os
+import time
+
+import httpx
+
+from http_client import (HTTP_BACKOFF, HTTP_CONNECT_TIMEOUT, HTTP_POOL_SIZE, HTTP_READ_TIMEOUT,
+                         HTTP_RETRIES, HTTP_RETRY_AFTER_MAX, RETRY_STATUSES)
+from records import Album, AlbumSummary
+from covers import cover_cache, coverKey
+from scannables import getScannableUrl, scannable_cache, scannableKey
+from search import ACCOUNTS_URL, API_URL, TRACK_PAGE_CONCURRENCY, album_cache, search_cache
+from serialize import loads
+
+# Upper bound on open upstream connections from this worker
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', 100))
+
+_client = None
+
+# (cache name, key) -> task loading it, so concurrent misses share one upstream call
+_inflight = {}
+
+
+async def startClient():
+    """Create the pooled async client; call once the event loop is running."""
+    global _client
+    _client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_POOL_SIZE),
+        timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        # Retries connection failures; status retries are handled in request()
+        transport=httpx.AsyncHTTPTransport(retries=HTTP_RETRIES),
+    )
+
+
+async def closeClient():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def request(method, url, **kwargs):
+    """Send a request, retrying 429/5xx with exponential backoff or the server's Retry-After, capped."""
+    for attempt in range(HTTP_RETRIES + 1):
+        response = await _client.request(method, url, **kwargs)
+        if response.status_code not in RETRY_STATUSES or attempt == HTTP_RETRIES:
+            return response
+        retry_after = response.headers.get('Retry-After', '')
+        delay = float(retry_after) if retry_after.isdigit() else HTTP_BACKOFF * 2 ** attempt
+        await asyncio.sleep(min(delay, HTTP_RETRY_AFTER_MAX))
+
+
+class AsyncTokenManager:
+    """Async version of auth.TokenManager: one refresh at a time, retry once on 401."""
+
+    def __init__(self, token_url, id_var, secret_var, refresh_margin=60):
+        self.token_url = token_url
+        self.id_var = id_var
+        self.secret_var = secret_var
+        self.refresh_margin = refresh_margin
+        self._token = None
+        self._expires_at = 0
+        self._lock = asyncio.Lock()
+
+    async def _fetchToken(self):
+        auth_string = os.getenv(self.id_var) + ":" + os.getenv(self.secret_var)
+        auth_base64 = str(base64.b64encode(auth_string.encode("utf-8")), "utf-8")
+        headers = {
+            "Authorization": "Basic " + auth_base64,
+            "Content-Type": "application/x-www-form-urlencoded"
+        }
+        result = await request('POST', self.token_url, headers=headers, data={"grant_type": "client_credentials"})
+
+        if result.status_code != 200:
+            print(f"Error: {result.status_code}, result: {result.text}")
+            result.raise_for_status()
+
+        json_result = result.json()
+        self._token = json_result['access_token']
+        self._expires_at = time.monotonic() + json_result.get('expires_in', 3600) - self.refresh_margin
+
+    async def getToken(self):
+        if self._token is None or time.monotonic() >= self._expires_at:
+            async with self._lock:
+                if self._token is None or time.monotonic() >= self._expires_at:
+                    await self._fetchToken()
+        return self._token
+
+    async def authorizedGet(self, url):
+        for _ in range(2):
+            token = await self.getToken()
+            response = await request('GET', url, headers={"Authorization": "Bearer " + token})
+            if response.status_code != 401:
+                break
+            if self._token == token:
+                self._token = None
+        return response
+
+
+token_manager = AsyncTokenManager(f"{ACCOUNTS_URL}/token", 'ID', 'SEC')
+
+
+async def cachedLoad(cache, key, loader):
+    """Async TTLCache.getOrLoad: return the cached value or await one shared loader() call."""
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    async def load():
+        value = await loader()
+        if value is not None:
+            cache.set(key, value)
+        return value
+
+    inflight_key = (cache.name, key)
+    task = _inflight.get(inflight_key)
+    if task is None:
+        task = asyncio.ensure_future(load())
+        _inflight[inflight_key] = task
+        task.add_done_callback(lambda _: _inflight.pop(inflight_key, None))
+    else:
+        cache.coalesced += 1
+    # Shielded so one caller going away does not cancel the load for the others
+    return await asyncio.shield(task)
+
+
+async def loadSearchResults(query, limit):
+    response = await token_manager.authorizedGet(f"{API_URL}/search?q={query}&type=album&limit={limit}")
+    if response.status_code != 200:
+        print(f"Error: {response.status_code}, result: {response.text}")
+        response.raise_for_status()
+
+    items = loads(response.content)['albums']['items']
+    return [AlbumSummary.fromPayload(album) for album in items] or None
+
+
+async def searchAlbums(query, limit=8):
+    key = f"{limit}:{query.strip().lower()}"
+    return await cachedLoad(search_cache, key, lambda: loadSearchResults(query, limit))
+
+
+async def getSearchResult(query, limit=8):
+    albums_data = await searchAlbums(query, limit) if query and query.strip() else None
+    if albums_data:
+        return {"albums": albums_data}
+    return {"error": {"message": "No results found.", "query": query}}
+
+
+async def fetchTracksPage(id, offset, limit, semaphore):
+    async with semaphore:
+        response = await token_manager.authorizedGet(f"{API_URL}/albums/{id}/tracks?offset={offset}&limit={limit}")
+    if response.status_code != 200:
+        print(f"Error: {response.status_code}, result: {response.text}")
+        response.raise_for_status()
+    return [song['name'] for song in loads(response.content)['items']]
+
+
+async def fetchRemainingTracks(id, first_page):
+    """Fetch every tracklist page after the first concurrently, at most TRACK_PAGE_CONCURRENCY at once."""
+    if not first_page.get('next'):
+        return []
+    limit = first_page['limit']
+    start = first_page['offset'] + len(first_page['items'])
+    semaphore = asyncio.Semaphore(TRACK_PAGE_CONCURRENCY)
+    pages = await asyncio.gather(*(fetchTracksPage(id, offset, limit, semaphore)
+                                   for offset in range(start, first_page['total'], limit)))
+    return [name for page in pages for name in page]
+
+
+async def loadAlbumInfo(id):
+    response = await token_manager.authorizedGet(f"{API_URL}/albums/{id}")
+    if response.status_code != 200:
+        return None
+    payload = loads(response.content)
+    album = Album.fromPayload(payload)
+    album.tracklist.extend(await fetchRemainingTracks(id, payload['tracks']))
+    return album
+
+
+async def fetchAlbumInfo(id):
+    return await cachedLoad(album_cache, id, lambda: loadAlbumInfo(id))
+
+
+async def getAlbumInfo(id):
+    album_info = await fetchAlbumInfo(id)
+    if album_info is None:
+        return {"error": {"message": "No results found.", "query": id}}
+    return album_info
+
+
+async def fetchBytes(url):
+    response = await request('GET', url)
+    response.raise_for_status()
+    return response.content
+
+
+async def fetchScannable(id, bg_color):
+    """Async scannables.fetchScannable: cached bytes, or one download that is then cached."""
+    key = scannableKey(id, bg_color)
+    data = scannable_cache.get(key)
+    if data is None:
+        data = await fetchBytes(getScannableUrl(id, bg_color))
+        scannable_cache.put(key, data)
+    return data
+
+
+async def fetchCover(url):
+    """Async covers.fetchCover: cached bytes, or one download that is then cached."""
+    key = coverKey(url)
+    data = cover_cache.get(key)
+    if data is None:
+        data = await fetchBytes(url)
+        cover_cache.put(key, data)
+    return data
+
+
+async def getPosterAssets(id, bg_color):
+    """Resolve an album and download its cover and scannable concurrently, or return None."""
+    album = await fetchAlbumInfo(id)
+    if album is None:
+        return None
+    cover_bytes, scannable_bytes = await asyncio.gather(fetchCover(album.cover_url), fetchScannable(id, bg_color))
+    return album, cover_bytes, scannable_bytes
@@ -0,0 +1,217 @@
+# Render posters for a list of albums into a directory.
+# usage: python batch.py [albums.txt] -o posters/ [--quality final] [--format jpeg] [--layout a4] [--workers N]
+# Each input line is an album id, a spotify:album: URI, an open.spotify.com album
+# link, or a search query whose top result is used. Reads stdin without a file.
+import argparse
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from covers import fetchCover
+from http_client import HTTP_FETCH_WORKERS, getExecutor
+from scannables import fetchScannable
+from encoders import FORMATS, PROFILES, extension, outputOptions
+from layout import DEFAULT_LAYOUT, LAYOUTS
+from poster import DEFAULT_BG_COLOR, TIER_SCALES
+from render_pool import RENDER_WORKERS, RenderPool, RenderPoolFull
+from search import ALBUM_ID_PATTERN, fetchAlbums, searchAlbums
+
+ALBUM_ID = re.compile(rf'(?:^|spotify:album:|open\.spotify\.com/album/)({ALBUM_ID_PATTERN})(?:$|[?/])')
+
+
+def readEntries(stream):
+    """Return the non-blank, non-comment lines of the input."""
+    entries = []
+    for line in stream:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            entries.append(line)
+    return entries
+
+
+def resolveEntry(entry):
+    """Return the album id an input line refers to, searching for it if needed, or None."""
+    match = ALBUM_ID.search(entry)
+    if match:
+        return match.group(1)
+    results = searchAlbums(entry, 1)
+    return results[0].id if results else None
+
+
+def downloadAssets(album, bg_color):
+    return album, fetchCover(album.cover_url), fetchScannable(album.id, bg_color)
+
+
+def writeAtomically(path, data):
+    # Write then rename, so an interrupted run never leaves a truncated poster to be skipped next time
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class Progress:
+    """Single-line progress and throughput display on stderr."""
+
+    def __init__(self, total):
+        self.total = total
+        self.rendered = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes_written = 0
+        self.started_at = time.monotonic()
+
+    def finished(self):
+        return self.rendered + self.skipped + self.failed
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started_at
+        return self.rendered / elapsed if elapsed else 0.0
+
+    def show(self):
+        rate = self.rate()
+        remaining = self.total - self.finished()
+        eta = f"{remaining / rate:.0f}s" if rate else "?"
+        print(f"\r[{self.finished()}/{self.total}] {self.rendered} rendered, {self.skipped} skipped, "
+              f"{self.failed} failed, {rate:.1f} posters/s, eta {eta}   ", end='', file=sys.stderr, flush=True)
+
+    def fail(self, entry, reason):
+        self.failed += 1
+        print(f"\n{entry}: {reason}", file=sys.stderr)
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started_at
+        print(f"\n{self.rendered} rendered, {self.skipped} skipped, {self.failed} failed in {elapsed:.1f}s "
+              f"({self.rate():.2f} posters/s, {self.bytes_written / 1024 / 1024:.1f} MB written)", file=sys.stderr)
+
+
+class BatchRun:
+    """Pipelines album lookups, downloads and renders for a list of album ids."""
+
+    def __init__(self, args):
+        self.args = args
+        self.pool = RenderPool(workers=args.workers, max_queued=args.workers)
+        self.downloads = ThreadPoolExecutor(max_workers=args.fetch_workers, thread_name_prefix='download')
+        self.renders = {}
+        self.progress = None
+
+    def outputPath(self, id):
+        return os.path.join(self.args.output, f"{id}.{extension(self.args.format)}")
+
+    def collect(self, futures):
+        """Write out every finished render among futures."""
+        for future in futures:
+            album = self.renders.pop(future)
+            try:
+                poster_bytes = self.pool.result(future)
+            except Exception as e:
+                self.progress.fail(album.id, e)
+                continue
+            writeAtomically(self.outputPath(album.id), poster_bytes)
+            self.progress.rendered += 1
+            self.progress.bytes_written += len(poster_bytes)
+        self.progress.show()
+
+    def submitRender(self, album, cover_bytes, scannable_bytes):
+        fields = {
+            'album_name': album.name,
+            'artist_name': album.artist_name,
+            'tracklist': album.tracklist,
+            'copyright_text': album.copyright,
+            'bg_color': self.args.bg_color,
+            **outputOptions(self.args.quality, self.args.format, self.args.profile),
+            'layout': self.args.layout,
+        }
+        while True:
+            try:
+                future = self.pool.submit(fields, cover_bytes, scannable_bytes)
+                break
+            except RenderPoolFull:
+                # Wait for a render to finish before queueing more, so memory stays bounded
+                done, _ = wait(self.renders, timeout=1, return_when=FIRST_COMPLETED)
+                self.collect(done)
+        self.renders[future] = album
+
+    def renderWindow(self, ids, albums):
+        for id in ids:
+            if id not in albums:
+                self.progress.fail(id, "album not found")
+        downloads = [(id, self.downloads.submit(downloadAssets, albums[id], self.args.bg_color)) for id in ids if id in albums]
+        for id, download in downloads:
+            try:
+                album, cover_bytes, scannable_bytes = download.result()
+            except Exception as e:
+                self.progress.fail(id, e)
+                continue
+            self.submitRender(album, cover_bytes, scannable_bytes)
+            self.collect([future for future in list(self.renders) if future.done()])
+
+    def run(self, entries):
+        os.makedirs(self.args.output, exist_ok=True)
+        self.progress = Progress(len(entries))
+
+        # Queries need a search each; ids and links are resolved locally
+        ids = []
+        lookups = [(entry, getExecutor().submit(resolveEntry, entry)) for entry in entries]
+        for entry, lookup in lookups:
+            try:
+                id = lookup.result()
+            except Exception as e:
+                # A failed search costs that line only, not the whole run
+                self.progress.fail(entry, e)
+                continue
+            if id is None:
+                self.progress.fail(entry, "no search results")
+            elif not self.args.force and os.path.exists(self.outputPath(id)):
+                self.progress.skipped += 1
+            else:
+                ids.append(id)
+        ids = list(dict.fromkeys(ids))
+        self.progress.total = len(ids) + self.progress.skipped + self.progress.failed
+        self.progress.show()
+
+        # Look up the next window of albums while the current one downloads and renders
+        windows = [ids[i:i + self.args.window] for i in range(0, len(ids), self.args.window)]
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='lookup') as lookups:
+            pending = lookups.submit(fetchAlbums, windows[0]) if windows else None
+            for i, window in enumerate(windows):
+                try:
+                    albums = pending.result()
+                except Exception as e:
+                    print(f"\nAlbum lookup failed: {e}", file=sys.stderr)
+                    albums = {}
+                if i + 1 < len(windows):
+                    pending = lookups.submit(fetchAlbums, windows[i + 1])
+                self.renderWindow(window, albums)
+
+        while self.renders:
+            done, _ = wait(self.renders, return_when=FIRST_COMPLETED)
+            self.collect(done)
+        self.progress.summary()
+        return self.progress.failed == 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input', nargs='?', type=argparse.FileType('r'), default=sys.stdin,
+                        help='file of album ids, links or queries, one per line (default: stdin)')
+    parser.add_argument('-o', '--output', default='posters', help='directory to write posters to')
+    parser.add_argument('--quality', default='final', choices=list(TIER_SCALES))
+    parser.add_argument('--format', default='jpeg', choices=list(FORMATS))
+    parser.add_argument('--profile', choices=list(PROFILES), help='encoder settings (default: by quality)')
+    parser.add_argument('--layout', default=DEFAULT_LAYOUT, choices=list(LAYOUTS), help='page template')
+    parser.add_argument('--bg-color', default=DEFAULT_BG_COLOR)
+    parser.add_argument('--workers', type=int, default=RENDER_WORKERS, help='render processes')
+    parser.add_argument('--fetch-workers', type=int, default=HTTP_FETCH_WORKERS, help='concurrent downloads')
+    parser.add_argument('--window', type=int, default=100, help='albums looked up per step')
+    parser.add_argument('--force', action='store_true', help='re-render posters that already exist')
+    args = parser.parse_args()
+
+    succeeded = BatchRun(args).run(readEntries(args.input))
+    sys.exit(0 if succeeded else 1)
+
+
+if __name__ == '__main__':
+    main()
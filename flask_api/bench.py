@@ -0,0 +1,451 @@
+# Micro-benchmarks for the poster pipeline.
+# usage: python bench.py <benchmark> [cover images...]
+import argparse
+import asyncio
+import base64
+import json
+import os
+import subprocess
+import sys
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from covers import RESAMPLING, cover_variants, prepareImage, scaleImage
+from encoders import FORMATS, PROFILES
+from palette import extractPalette, pickDistinctColors, rgbToLab, usedPaletteColors
+from fonts import getFont
+from layers import LayerCache
+from layout import LAYOUTS, compileLayout, renderPlan
+from poster import TIER_SCALES, composePoster, drawTracklist, renderPoster
+from text_layout import clearMeasurements, layoutTracklist, textWidth
+from records import Album
+from serialize import dumps, loads
+from stub_server import albumFixture
+
+SAMPLE_COVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'website', 'public', 'images', 'drake2.jpg')
+
+
+def timeit(fn, repeat=5):
+    """Return the best wall time of fn over repeat runs, in milliseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def loadCovers(paths):
+    """Open and decode the given covers, defaulting to the bundled sample image."""
+    covers = []
+    for path in paths or [SAMPLE_COVER]:
+        image = Image.open(path)
+        image.load()
+        covers.append((os.path.basename(path), image))
+    return covers
+
+
+def benchPalette(covers, args):
+    """Full-resolution median cut versus bounded-thumbnail quantization."""
+    def fullResolution(image):
+        paletted = image.convert('RGB').convert('P', palette=Image.ADAPTIVE, colors=20)
+        return pickDistinctColors(usedPaletteColors(paletted), 5)
+
+    print(f"{'cover':<24}{'size':>12}{'full ms':>10}{'thumb ms':>10}{'mean dE':>10}{'max dE':>10}")
+    for name, image in covers:
+        reference = fullResolution(image)
+        swatches = extractPalette(image, max_size=args.max_size, quantizer=args.quantizer)
+
+        # Distance from each new swatch to the closest reference swatch
+        distances = np.sqrt(((rgbToLab(swatches)[:, None] - rgbToLab(reference)[None]) ** 2).sum(axis=2))
+        closest = distances.min(axis=1)
+
+        full_ms = timeit(lambda: fullResolution(image))
+        thumb_ms = timeit(lambda: extractPalette(image, max_size=args.max_size, quantizer=args.quantizer))
+        size = f"{image.width}x{image.height}"
+        print(f"{name[:23]:<24}{size:>12}{full_ms:>10.1f}{thumb_ms:>10.1f}{closest.mean():>10.1f}{closest.max():>10.1f}")
+
+
+def benchScale(covers, args):
+    """Cover scaling per quality tier, upscale (640px) and downscale (large JPEG) paths apart."""
+    size = (2120, 2120)
+    print(f"{'cover':<24}{'path':<12}{'tier':<10}{'ms':>10}")
+    for name, image in covers:
+        # A Spotify-sized 640px cover for the upscale path
+        small = image.convert('RGB').resize((640, 640))
+
+        # A large JPEG, decoded inside the timed call so draft() can take effect
+        large = BytesIO()
+        image.convert('RGB').resize((3000, 3000)).save(large, 'JPEG', quality=90)
+
+        for quality in RESAMPLING:
+            upscale_ms = timeit(lambda: scaleImage(small, size, quality))
+            print(f"{name[:23]:<24}{'upscale':<12}{quality:<10}{upscale_ms:>10.1f}")
+        for quality in RESAMPLING:
+            downscale_ms = timeit(lambda: scaleImage(prepareImage(Image.open(BytesIO(large.getvalue())), size), size, quality))
+            print(f"{name[:23]:<24}{'downscale':<12}{quality:<10}{downscale_ms:>10.1f}")
+        baseline_ms = timeit(lambda: Image.open(BytesIO(large.getvalue())).resize(size))
+        print(f"{name[:23]:<24}{'downscale':<12}{'baseline':<10}{baseline_ms:>10.1f}")
+
+
+# (format, label, save options) for the encode benchmark; the profiles are added below
+ENCODE_MATRIX = [
+    ('jpeg', 'pillow default', {}),
+    ('jpeg', 'q85 progressive', {'quality': 85, 'progressive': True, 'optimize': True}),
+    ('jpeg', 'q92 4:2:0', {'quality': 92, 'progressive': True, 'optimize': True, 'subsampling': '4:2:0'}),
+    ('webp', 'q80 method 6', {'quality': 80, 'method': 6}),
+    ('webp', 'lossless', {'lossless': True, 'method': 4}),
+    ('png', 'optimize', {'optimize': True}),
+    ('png', 'level 1', {'compress_level': 1}),
+]
+
+
+def benchEncode(covers, args):
+    """Encode time versus size for each format and setting, on posters rendered at each tier."""
+    matrix = ENCODE_MATRIX + [(format, f"profile {profile}", options)
+                              for profile, formats in PROFILES.items() for format, options in formats.items()]
+    scannable = Image.new('RGB', (512, 128), (222, 216, 206))
+    tracklist = [f"Track {i}" for i in range(12)]
+    print(f"{'cover':<16}{'tier':<9}{'format':<7}{'settings':<20}{'ms':>9}{'KB':>9}")
+    for name, image in covers:
+        for quality in ('preview', 'final'):
+            poster = composePoster('DED8CE', image.copy(), 'Album Name', 'Artist', tracklist, scannable, '(c) Label', quality)
+            for format, label, options in sorted(matrix, key=lambda row: row[0]):
+                if format not in FORMATS:
+                    continue
+                def encode():
+                    out = BytesIO()
+                    poster.save(out, format.upper(), **options)
+                    return out
+                size_kb = len(encode().getvalue()) / 1024
+                encode_ms = timeit(encode, repeat=3)
+                print(f"{name[:15]:<16}{quality:<9}{format:<7}{label:<20}{encode_ms:>9.1f}{size_kb:>9.0f}")
+
+
+def benchRender(covers, args):
+    """Whole renders from encoded bytes with a cold and a warm cover-variant cache."""
+    scannable = BytesIO()
+    Image.new('RGB', (512, 128), (222, 216, 206)).save(scannable, 'PNG')
+    print(f"{'cover':<24}{'tier':<10}{'cold ms':>10}{'warm ms':>10}")
+    for name, image in covers:
+        cover_bytes = BytesIO()
+        image.convert('RGB').save(cover_bytes, 'JPEG', quality=90)
+        for quality in ('draft', 'preview', 'final'):
+            fields = {'bg_color': 'DED8CE', 'album_name': 'Album', 'artist_name': 'Artist', 'copyright_text': '(c) Label',
+                      'tracklist': [f"Track {i}" for i in range(12)], 'quality': quality}
+            render = lambda: renderPoster(fields, cover_bytes.getvalue(), scannable.getvalue())
+
+            def cold():
+                cover_variants.clear()
+                render()
+            cold_ms = timeit(cold, repeat=3)
+            warm_ms = timeit(render, repeat=3)
+            print(f"{name[:23]:<24}{quality:<10}{cold_ms:>10.1f}{warm_ms:>10.1f}")
+
+
+# Word pools for long, realistic tracklists
+TRACK_WORDS = ['Midnight', 'City', 'Lights', 'Love', 'Never', 'Forever', 'Dancing', 'Alone', 'Summer', 'Rain',
+               'Heart', 'Golden', 'Highway', 'Dreams', 'Fire', 'Letters', 'Home', 'Again', 'Electric', 'Blue']
+TRACK_SUFFIXES = ['', '', '', ' (feat. Someone Else)', ' - Remastered 2011', ' (Live at the Royal Albert Hall)',
+                  ' - Extended Mix', ' (Acoustic Version)']
+
+
+def longTracklist(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return [' '.join(rng.choice(TRACK_WORDS, rng.integers(1, 5))) + TRACK_SUFFIXES[rng.integers(len(TRACK_SUFFIXES))]
+            for _ in range(count)]
+
+
+def benchTracklist(covers, args):
+    """Tracklist layout for 12 to 80 tracks: fixed-size drawing versus the fitted layout."""
+    font = getFont('kollektif', 'regular', 40)
+    box = {'x': 180, 'start_y': 2330, 'end_y': 3420, 'width': 1000, 'margin': 200, 'gutter': 60, 'short_rows': 5}
+    canvas = Image.new('RGB', (2480, 3508), 'white')
+    draw = ImageDraw.Draw(canvas)
+
+    def fixedSize(tracklist):
+        # The previous drawTracklist: one size, one column, nothing measured
+        spacing = (box['end_y'] - box['start_y']) // len(tracklist)
+        for i, track in enumerate(tracklist):
+            draw.text((box['x'], box['start_y'] + i * spacing), track, font=font, fill='black')
+        return spacing
+
+    print(f"{'tracks':>7}{'old ms':>9}{'old overflow':>14}{'cold ms':>9}{'warm ms':>9}{'size':>6}{'cols':>6}{'overflow':>10}")
+    for count in (12, 30, 45, 60, 80):
+        tracklist = longTracklist(count)
+        old_ms = timeit(lambda: fixedSize(tracklist), repeat=3)
+        spacing = fixedSize(tracklist)
+        # Lines wider than the column, plus rows packed tighter than the font
+        old_overflow = sum(textWidth(font, track) > box['width'] for track in tracklist)
+        old_overflow += count if spacing < font.size else 0
+
+        def cold():
+            clearMeasurements()
+            drawTracklist(draw, tracklist, font, box['start_y'], box['end_y'], x=box['x'], margin=box['margin'],
+                          width=box['width'], gutter=box['gutter'], short_rows=box['short_rows'])
+        cold_ms = timeit(cold, repeat=3)
+        warm_ms = timeit(lambda: drawTracklist(draw, tracklist, font, box['start_y'], box['end_y'], x=box['x'],
+                                               margin=box['margin'], width=box['width'], gutter=box['gutter'],
+                                               short_rows=box['short_rows']))
+        layout = layoutTracklist(tracklist, font, box['x'], box['start_y'], box['end_y'], box['width'], box['margin'], box['gutter'],
+                                 box['short_rows'])
+        column_width = (box['width'] - box['gutter'] * (layout.columns - 1)) // layout.columns
+        overflow = sum(textWidth(layout.font, line.text) > column_width for line in layout.lines)
+        print(f"{count:>7}{old_ms:>9.1f}{old_overflow:>14}{cold_ms:>9.1f}{warm_ms:>9.1f}{layout.font.size:>6}{layout.columns:>6}{overflow:>10}")
+
+
+def benchLayout(covers, args):
+    """Compiling each layout's render plan versus looking up the compiled plan, and a render per layout."""
+    scannable = BytesIO()
+    Image.new('RGB', (512, 128), (222, 216, 206)).save(scannable, 'PNG')
+    cover_bytes = BytesIO()
+    covers[0][1].convert('RGB').save(cover_bytes, 'JPEG', quality=90)
+    print(f"{'layout':<10}{'tier':<10}{'compile us':>12}{'plan us':>10}{'render ms':>11}")
+    for layout, spec in LAYOUTS.items():
+        for quality, scale in TIER_SCALES.items():
+            compile_us = timeit(lambda: compileLayout(layout, spec, scale), repeat=200) * 1000
+            plan_us = timeit(lambda: renderPlan(layout, scale), repeat=200) * 1000
+            fields = {'bg_color': 'DED8CE', 'album_name': 'Album', 'artist_name': 'Artist', 'copyright_text': '(c) Label',
+                      'tracklist': longTracklist(12), 'quality': quality, 'layout': layout}
+            render_ms = timeit(lambda: renderPoster(fields, cover_bytes.getvalue(), scannable.getvalue()), repeat=3)
+            print(f"{layout:<10}{quality:<10}{compile_us:>12.1f}{plan_us:>10.2f}{render_ms:>11.1f}")
+
+
+def benchLayers(covers, args):
+    """Session re-renders after a one-field edit: the whole page versus redrawing only the changed layers."""
+    scannable = BytesIO()
+    Image.new('RGB', (512, 128), (222, 216, 206)).save(scannable, 'PNG')
+    edits = {
+        'title': ('album_name', ['Album', 'Another Album']),
+        'tracklist': ('tracklist', [longTracklist(12), longTracklist(12, seed=1)]),
+        'copyright': ('copyright_text', ['(c) Label', '(p) Other Label']),
+    }
+    print(f"{'cover':<24}{'tier':<10}{'edit':<12}{'full ms':>9}{'layer ms':>10}{'+encode ms':>12}")
+    for name, image in covers:
+        cover_bytes = BytesIO()
+        image.convert('RGB').save(cover_bytes, 'JPEG', quality=90)
+        for quality in ('preview', 'final'):
+            fields = {'bg_color': 'DED8CE', 'album_name': 'Album', 'artist_name': 'Artist', 'copyright_text': '(c) Label',
+                      'tracklist': longTracklist(12), 'quality': quality}
+            layers = LayerCache()
+            for edit, (field, values) in edits.items():
+                edited = [dict(fields, **{field: value}) for value in values]
+                full_ms = timeit(lambda: renderPoster(edited[0], cover_bytes.getvalue(), scannable.getvalue()), repeat=3)
+                # Alternate between two values so every run redraws the edited layer
+                turn = iter(range(1 << 30))
+
+                layer_ms = timeit(lambda: layers.compose('bench', edited[next(turn) % 2], cover_bytes.getvalue(),
+                                                         scannable.getvalue()))
+                render_ms = timeit(lambda: layers.render('bench', edited[next(turn) % 2], cover_bytes.getvalue(),
+                                                         scannable.getvalue()))
+                print(f"{name[:23]:<24}{quality:<10}{edit:<12}{full_ms:>9.1f}{layer_ms:>10.1f}{render_ms:>12.1f}")
+
+
+def memoryStatus(field):
+    """Return a memory field (VmRSS, VmHWM) of this process in MB, from /proc (Linux only)."""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+
+
+def resetPeakRSS():
+    """Reset VmHWM to the current RSS so the next peak is measured from here."""
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+
+
+def uploadRequest(path, cover_path, quality):
+    """Send one /poster request in this process and print the peak RSS it added."""
+    from app import app, render_cache
+    render_cache.max_bytes = 0
+    client = app.test_client()
+
+    with open(cover_path, 'rb') as f:
+        cover_bytes = f.read()
+    scannable = BytesIO()
+    Image.new('RGB', (512, 128), (222, 216, 206)).save(scannable, 'PNG')
+    fields = {
+        'album_name': 'Album',
+        'artist_name': 'Artist',
+        'copyright_text': '(c) Label',
+    }
+    tracklist = [f"Track {i}" for i in range(12)]
+
+    if path == 'json':
+        body = dict(fields, tracklist=tracklist,
+                    image=base64.b64encode(cover_bytes).decode(),
+                    scannable=base64.b64encode(scannable.getvalue()).decode())
+        kwargs = {'json': body}
+    else:
+        body = dict(fields, tracklist=json.dumps(tracklist),
+                    image=(BytesIO(cover_bytes), 'cover.jpg'),
+                    scannable=(BytesIO(scannable.getvalue()), 'scannable.png'))
+        kwargs = {'data': body, 'content_type': 'multipart/form-data'}
+
+    resetPeakRSS()
+    before = memoryStatus('VmRSS')
+    response = client.post(f"/poster?quality={quality}", **kwargs)
+    assert response.status_code == 200, response.data
+    print(json.dumps({'path': path, 'rss_mb': memoryStatus('VmHWM') - before}))
+
+
+def benchUpload(covers, args):
+    """Peak RSS added by one /poster request, JSON/base64 versus multipart, each in a fresh process."""
+    print(f"{'cover':<24}{'path':<12}{'peak RSS MB':>12}")
+    for path in args.covers or [SAMPLE_COVER]:
+        for upload in ('json', 'multipart'):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), 'upload-request', path, '--upload', upload, '--quality', args.quality],
+                capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+            ).stdout.strip().splitlines()[-1]
+            result = json.loads(output)
+            print(f"{os.path.basename(path)[:23]:<24}{upload:<12}{result['rss_mb']:>12.1f}")
+
+
+def benchParse(covers, args):
+    """Album payload handling: five response.json() calls and json.dumps versus one parse into a record."""
+    def parseEachField(text):
+        # What getAlbumInfo used to do: every field re-parsed the whole body
+        album_name = json.loads(text)['name']
+        artist_name = json.loads(text)['artists'][0]['name']
+        cover_url = json.loads(text)['images'][0]['url']
+        tracklist = [song['name'] for song in json.loads(text)['tracks']['items']]
+        copyright = json.loads(text)['copyrights'][0]['text']
+        return json.dumps({"album-name": album_name, "artist-name": artist_name, "cover-url": cover_url,
+                           "tracklist": tracklist, "copyright": copyright})
+
+    def parseOnce(content):
+        return dumps(Album.fromPayload(loads(content)))
+
+    print(f"{'tracks':>8}{'payload KB':>12}{'per-field us':>14}{'once us':>10}")
+    for num_tracks in (12, 30, 50):
+        text = json.dumps(albumFixture('bench', 'http://stub', num_tracks))
+        content = text.encode('utf-8')
+        assert json.loads(parseEachField(text)) == json.loads(parseOnce(content))
+        each_us = timeit(lambda: parseEachField(text), repeat=50) * 1000
+        once_us = timeit(lambda: parseOnce(content), repeat=50) * 1000
+        print(f"{num_tracks:>8}{len(content) / 1024:>12.1f}{each_us:>14.0f}{once_us:>10.0f}")
+
+
+# How to start each deployment under test; {port} and {workers} are filled in
+SERVERS = {
+    'sync': ['gunicorn', '-w', '{workers}', '-b', '127.0.0.1:{port}', 'app:app'],
+    'async': ['uvicorn', 'asgi_app:app', '--workers', '{workers}', '--port', '{port}', '--log-level', 'warning'],
+}
+
+
+def startProcess(command, env=None):
+    here = os.path.dirname(os.path.abspath(__file__))
+    return subprocess.Popen(command, cwd=here, env=dict(os.environ, **(env or {})),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def waitForServer(url, timeout=30):
+    import requests
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+async def runLoad(base_url, concurrency, total):
+    """Send total uncached /search requests with concurrency clients; return (seconds, latencies, errors)."""
+    import httpx
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    # A unique query per request so every one goes upstream
+                    response = await client.get(f"{base_url}/search?type=search&query=load{i}-{time.time_ns()}&quantity=8")
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        return time.perf_counter() - start, sorted(latencies), errors
+
+
+def benchLoad(covers, args):
+    """Sync gunicorn versus async uvicorn under 50/200/500 concurrent clients, against the stub upstream."""
+    stub_port, server_port = 8091, 8092
+    stub = startProcess([sys.executable, 'stub_server.py', '--port', str(stub_port), '--delay', str(args.upstream_delay)])
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    env = {
+        'SPOTIFY_ACCOUNTS_URL': f"{stub_url}/api",
+        'SPOTIFY_API_URL': f"{stub_url}/v1",
+        'SCANNABLES_URL': stub_url,
+        'ID': 'bench',
+        'SEC': 'bench',
+    }
+    print(f"upstream delay {args.upstream_delay * 1000:.0f}ms, {args.workers} workers")
+    print(f"{'server':<8}{'clients':>8}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    try:
+        waitForServer(stub_url)
+        for name in args.servers.split(','):
+            command = [part.format(port=server_port, workers=args.workers) for part in SERVERS[name]]
+            server = startProcess(command, env)
+            try:
+                base_url = f"http://127.0.0.1:{server_port}"
+                waitForServer(base_url)
+                for concurrency in (50, 200, 500):
+                    total = concurrency * args.rounds
+                    seconds, latencies, errors = asyncio.run(runLoad(base_url, concurrency, total))
+                    p50 = latencies[len(latencies) // 2] * 1000
+                    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+                    print(f"{name:<8}{concurrency:>8}{total:>10}{total / seconds:>10.1f}{p50:>10.0f}{p99:>10.0f}{errors:>8}")
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+BENCHMARKS = {
+    'encode': benchEncode,
+    'palette': benchPalette,
+    'layers': benchLayers,
+    'layout': benchLayout,
+    'load': benchLoad,
+    'parse': benchParse,
+    'render': benchRender,
+    'tracklist': benchTracklist,
+    'scale': benchScale,
+    'upload': benchUpload,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS) + ['upload-request'])
+    parser.add_argument('covers', nargs='*', help='cover images to benchmark with')
+    parser.add_argument('--max-size', type=int, default=None, help='palette thumbnail cap')
+    parser.add_argument('--quantizer', default=None, help='mediancut, fastoctree or libimagequant')
+    parser.add_argument('--upload', default='json', help='json or multipart (upload-request only)')
+    parser.add_argument('--quality', default='final', help='render tier for request benchmarks')
+    parser.add_argument('--servers', default='sync,async', help='deployments to load test (load only)')
+    parser.add_argument('--workers', type=int, default=2, help='server worker processes (load only)')
+    parser.add_argument('--rounds', type=int, default=2, help='requests per client (load only)')
+    parser.add_argument('--upstream-delay', type=float, default=0.1, help='stub API latency in seconds (load only)')
+    args = parser.parse_args()
+    if args.benchmark == 'upload-request':
+        uploadRequest(args.upload, args.covers[0], args.quality)
+        sys.exit()
+    BENCHMARKS[args.benchmark](loadCovers(args.covers), args)
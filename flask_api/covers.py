@@ -0,0 +1,118 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from PIL import Image
+
+from http_client import fetchBytes
+from palette import extractPalette
+from render_cache import RenderCache
+
+# Resampling filter and reducing_gap for each quality tier
+RESAMPLING = {
+    'draft': (Image.Resampling.BILINEAR, 2.0),
+    'preview': (Image.Resampling.BICUBIC, 2.0),
+    'final': (Image.Resampling.LANCZOS, 3.0),
+}
+
+# Compressed covers by URL in the web process, and decoded variants in each render process
+COVER_CACHE_BYTES = int(os.getenv('COVER_CACHE_BYTES', 64 * 1024 * 1024))
+COVER_CACHE_DIR = os.getenv('COVER_CACHE_DIR')
+COVER_VARIANT_BYTES = int(os.getenv('COVER_VARIANT_BYTES', 128 * 1024 * 1024))
+
+cover_cache = RenderCache(COVER_CACHE_BYTES, COVER_CACHE_DIR)
+
+
+def prepareImage(image, size):
+    """Decode at the smallest JPEG scale that still covers size, normalized to RGB once."""
+    if image.format == 'JPEG':
+        image.draft('RGB', size)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+
+def scaleImage(image, size, quality='final'):
+    """Scale the image to size with the filter for the quality tier."""
+    if image.size == tuple(size):
+        return image
+    resample, reducing_gap = RESAMPLING[quality]
+    if image.width <= size[0] and image.height <= size[1]:
+        # reducing_gap only helps when shrinking
+        reducing_gap = None
+    return image.resize(size, resample, reducing_gap=reducing_gap)
+
+
+def coverKey(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def fetchCover(url):
+    """Return the cover image bytes at url, downloading them only once."""
+    key = coverKey(url)
+    data = cover_cache.get(key)
+    if data is None:
+        data = fetchBytes(url)
+        cover_cache.put(key, data)
+    return data
+
+
+class CoverVariants:
+    """Poster-ready covers keyed by (content digest, size, quality), with their palettes.
+
+    Each entry holds the cover decoded and resized for one tier plus its
+    swatches, so a hit skips decode, resize and quantize. Eviction is least
+    recently used, bounded by the decoded pixel memory.
+    """
+
+    def __init__(self, max_bytes=COVER_VARIANT_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, data, size, quality='final'):
+        """Return (cover resized to size, palette) for encoded cover bytes."""
+        key = (hashlib.sha256(data).digest(), tuple(size), quality)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        image = prepareImage(Image.open(BytesIO(data)), size)
+        # The palette comes from the prepared cover, exactly as an uncached render does
+        entry = (scaleImage(image, size, quality), extractPalette(image, num_colors=5, palette_size=20))
+        entry_bytes = len(entry[0].mode) * entry[0].width * entry[0].height
+
+        with self._lock:
+            self.misses += 1
+            if key not in self._entries and entry_bytes <= self.max_bytes:
+                self._entries[key] = entry
+                self._bytes += entry_bytes
+                while self._bytes > self.max_bytes:
+                    _, (old, _) = self._entries.popitem(last=False)
+                    self._bytes -= len(old.mode) * old.width * old.height
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+        }
+
+
+cover_variants = CoverVariants()
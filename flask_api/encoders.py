@@ -0,0 +1,76 @@
+from io import BytesIO
+
+from PIL import features
+
+# Mimetype and file extension of each output format
+FORMATS = {
+    'jpeg': {'mimetype': 'image/jpeg', 'extension': 'jpg'},
+    'webp': {'mimetype': 'image/webp', 'extension': 'webp'},
+    'png': {'mimetype': 'image/png', 'extension': 'png'},
+}
+
+# AVIF needs a Pillow built with libavif (Pillow 11.2+)
+if features.check('avif'):
+    FORMATS['avif'] = {'mimetype': 'image/avif', 'extension': 'avif'}
+
+# Pillow save() options for each format under each quality profile.
+# 'web' is for on-screen previews, 'print' keeps text and flat colours clean at full size
+PROFILES = {
+    'web': {
+        'jpeg': {'quality': 80, 'progressive': True, 'optimize': True, 'subsampling': '4:2:0'},
+        'webp': {'quality': 80, 'method': 4},
+        'png': {'compress_level': 1},
+        'avif': {'quality': 60, 'speed': 8},
+    },
+    'print': {
+        'jpeg': {'quality': 92, 'progressive': True, 'optimize': True, 'subsampling': '4:4:4'},
+        'webp': {'quality': 92, 'method': 4},
+        'png': {'optimize': True},
+        'avif': {'quality': 80, 'speed': 8},
+    },
+}
+
+DEFAULT_FORMAT = 'jpeg'
+
+# Profile used when a request does not pick one, by render tier
+TIER_PROFILES = {
+    'draft': 'web',
+    'preview': 'web',
+    'final': 'print',
+}
+
+
+def encodePoster(image, format=DEFAULT_FORMAT, profile='print'):
+    """Encode a rendered poster to bytes in format with the settings of profile."""
+    img_io = BytesIO()
+    image.save(img_io, format.upper(), **PROFILES[profile][format])
+    return img_io.getvalue()
+
+
+def mimetype(format):
+    return FORMATS[format]['mimetype']
+
+
+def extension(format):
+    return FORMATS[format]['extension']
+
+
+def outputOptions(quality=None, format=None, profile=None):
+    """Return the render tier, format and encoder profile of a request with defaults filled in."""
+    quality = quality or 'final'
+    return {
+        'quality': quality,
+        'format': (format or DEFAULT_FORMAT).lower(),
+        'profile': profile or TIER_PROFILES.get(quality),
+    }
+
+
+def outputError(options):
+    """Return why a set of output options is invalid, or None."""
+    if options['quality'] not in TIER_PROFILES:
+        return f"Invalid quality: {options['quality']}"
+    if options['format'] not in FORMATS:
+        return f"Invalid format: {options['format']}"
+    if options['profile'] not in PROFILES:
+        return f"Invalid profile: {options['profile']}"
+    return None
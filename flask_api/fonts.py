@@ -0,0 +1,62 @@
+import os
+import threading
+
+from PIL import ImageFont
+
+# Fonts are resolved relative to this module so gunicorn can start from any cwd
+FONT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fonts')
+
+FONT_FILES = {
+    ('kollektif', 'regular'): 'kollektif/Kollektif.ttf',
+    ('kollektif', 'bold'): 'kollektif/Kollektif-Bold.ttf',
+    ('kollektif', 'italic'): 'kollektif/Kollektif-Italic.ttf',
+    ('kollektif', 'bold-italic'): 'kollektif/Kollektif-BoldItalic.ttf',
+}
+
+# One FreeTypeFont per (family, weight, size), shared by every request in this worker
+_fonts = {}
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def fontPath(family, weight):
+    """Return the absolute path of a registered font face."""
+    try:
+        return os.path.join(FONT_DIR, FONT_FILES[(family, weight)])
+    except KeyError:
+        raise ValueError(f"Unknown font: {family} {weight}")
+
+
+def getFont(family, weight, size):
+    """Return the cached font for (family, weight, size), loading it on first use."""
+    key = (family, weight, size)
+    font = _fonts.get(key)
+    if font is None:
+        with _lock:
+            font = _fonts.get(key)
+            if font is None:
+                font = ImageFont.truetype(fontPath(family, weight), size, encoding="unic")
+                _fonts[key] = font
+                _stats['misses'] += 1
+                return font
+    _stats['hits'] += 1
+    return font
+
+
+def resizedFont(font, size):
+    """Return the cached font of the same registered face as font, at another size."""
+    for (family, weight), relative_path in FONT_FILES.items():
+        if font.path == os.path.join(FONT_DIR, relative_path):
+            return getFont(family, weight, size)
+    return font.font_variant(size=size)
+
+
+def warmFonts(specs):
+    """Load every (family, weight, size) in specs ahead of the first request."""
+    for family, weight, size in specs:
+        getFont(family, weight, size)
+
+
+def fontCacheStats():
+    """Return hit/miss counters and the number of loaded faces."""
+    return {'hits': _stats['hits'], 'misses': _stats['misses'], 'size': len(_fonts)}
@@ -0,0 +1,12 @@
+# Gunicorn settings for the Procfile: gunicorn -c gunicorn_config.py -b :$PORT app:app
+import os
+
+from render_pool import RENDER_QUEUE, RENDER_WORKERS
+
+# One web process owns the render pool (render_pool.py), which spreads /poster over
+# RENDER_WORKERS render processes and answers 503 once RENDER_QUEUE more are waiting.
+# A request holds its thread while its render runs or waits, so every render slot and
+# queue place needs a thread of its own, plus a few for /search, /stats and the rest.
+workers = 1
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', RENDER_WORKERS + RENDER_QUEUE + 8))
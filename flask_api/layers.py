@@ -0,0 +1,167 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from PIL import ImageDraw
+
+from covers import cover_variants
+from encoders import DEFAULT_FORMAT, TIER_PROFILES, encodePoster
+from layout import DEFAULT_LAYOUT, renderPlan
+from poster import LAYERS, TIER_SCALES, getBackground, hexToRGB
+from scannables import scannableImage
+
+# Composed pages kept per render process for editing sessions, bounded by their pixel memory
+LAYER_CACHE_BYTES = int(os.getenv('LAYER_CACHE_BYTES', 256 * 1024 * 1024))
+
+# Inputs each layer is drawn from; 'cover' and 'scannable' stand for digests of the image bytes
+LAYER_INPUTS = {
+    'cover': ('cover',),
+    'palette': ('cover',),
+    'header': ('artist_name', 'album_name'),
+    'tracklist': ('tracklist',),
+    'footer': ('scannable', 'copyright_text'),
+}
+
+# Inputs the whole page depends on; changing one redraws every layer
+PAGE_INPUTS = ('bg_color', 'quality', 'layout')
+
+
+@dataclass(slots=True)
+class SessionPage:
+    """A session's last composed page and the inputs each of its layers was drawn from."""
+    page: tuple
+    layers: dict
+    image: object
+
+
+def layerInputs(fields, image_bytes, scannable_bytes):
+    """Return (page inputs, {layer: inputs}) for a render, comparable between renders."""
+    values = {'layout': DEFAULT_LAYOUT, **fields}
+    values['cover'] = hashlib.sha256(image_bytes).digest()
+    values['scannable'] = hashlib.sha256(scannable_bytes).digest()
+    values['tracklist'] = tuple(values.get('tracklist') or ())
+    page = tuple(values[name] for name in PAGE_INPUTS)
+    return page, {layer: tuple(values[name] for name in names) for layer, names in LAYER_INPUTS.items()}
+
+
+def drawLayers(image, layers, fields, image_bytes, scannable_bytes, clear=True):
+    """Draw the named layers onto a composed page, clearing each one's box to the background first."""
+    quality = fields['quality']
+    plan = renderPlan(fields.get('layout', DEFAULT_LAYOUT), TIER_SCALES[quality])
+    inputs = dict(fields)
+    if 'cover' in layers or 'palette' in layers:
+        inputs['image'], inputs['palette'] = cover_variants.get(image_bytes, plan.cover_size, quality)
+    if 'footer' in layers:
+        inputs['scannable'] = scannableImage(scannable_bytes, plan.scannable_scale)
+
+    draw = ImageDraw.Draw(image)
+    background = hexToRGB(fields['bg_color'])
+    for layer, draw_layer in LAYERS.items():
+        if layer not in layers:
+            continue
+        if clear:
+            image.paste(background, plan.boxes[layer])
+        draw_layer(image, draw, plan, quality, inputs)
+
+
+class LayerCache:
+    """Last composed page of each editing session, redrawn one layer at a time.
+
+    A render for a known session compares its inputs with the ones the cached
+    page was drawn from and redraws only the layers that changed: a new title
+    repaints the header box, not the cover, palette and tracklist. A new
+    colour, tier or layout redraws the whole page. Sessions are evicted least
+    recently used, bounded by the memory of their pages.
+
+    Pages are redrawn in place without a lock: each render process runs one
+    job at a time, and the pool sends all of a session's renders to one process.
+    """
+
+    def __init__(self, max_bytes=LAYER_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.full_renders = 0
+        self.partial_renders = 0
+        self.layers_drawn = 0
+        self.layers_reused = 0
+
+    def _entry(self, session):
+        with self._lock:
+            entry = self._sessions.get(session)
+            if entry is not None:
+                self._sessions.move_to_end(session)
+            return entry
+
+    def _store(self, session, entry):
+        entry_bytes = len(entry.image.mode) * entry.image.width * entry.image.height
+        with self._lock:
+            old = self._sessions.pop(session, None)
+            if old is not None:
+                self._bytes -= len(old.image.mode) * old.image.width * old.image.height
+            if entry_bytes > self.max_bytes:
+                return
+            self._sessions[session] = entry
+            self._bytes += entry_bytes
+            while self._bytes > self.max_bytes:
+                _, old = self._sessions.popitem(last=False)
+                self._bytes -= len(old.image.mode) * old.image.width * old.image.height
+
+    def _discard(self, session):
+        with self._lock:
+            old = self._sessions.pop(session, None)
+            if old is not None:
+                self._bytes -= len(old.image.mode) * old.image.width * old.image.height
+
+    def compose(self, session, fields, image_bytes, scannable_bytes):
+        """Bring the session's page up to date with a render's inputs and return it."""
+        page, layers = layerInputs(fields, image_bytes, scannable_bytes)
+        entry = self._entry(session)
+        if entry is not None and entry.page == page:
+            changed = [layer for layer in LAYERS if entry.layers[layer] != layers[layer]]
+            try:
+                drawLayers(entry.image, changed, fields, image_bytes, scannable_bytes)
+            except BaseException:
+                # A bad upload or the time limit can stop a redraw after clearing a box; never keep that page
+                self._discard(session)
+                raise
+            entry.layers = layers
+            self.partial_renders += 1
+            self.layers_drawn += len(changed)
+            self.layers_reused += len(LAYERS) - len(changed)
+            return entry.image
+
+        image = getBackground(fields['bg_color'], fields.get('layout', DEFAULT_LAYOUT), TIER_SCALES[fields['quality']])
+        drawLayers(image, LAYERS, fields, image_bytes, scannable_bytes, clear=False)
+        self._store(session, SessionPage(page, layers, image))
+        self.full_renders += 1
+        self.layers_drawn += len(LAYERS)
+        return image
+
+    def render(self, session, fields, image_bytes, scannable_bytes):
+        """Render a poster for an editing session, redrawing only what changed since its last render."""
+        image = self.compose(session, fields, image_bytes, scannable_bytes)
+        quality = fields['quality']
+        return encodePoster(image, fields.get('format', DEFAULT_FORMAT), fields.get('profile') or TIER_PROFILES[quality])
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self._bytes = 0
+
+    def stats(self):
+        return {
+            'sessions': len(self._sessions),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'full_renders': self.full_renders,
+            'partial_renders': self.partial_renders,
+            'layers_drawn': self.layers_drawn,
+            'layers_reused': self.layers_reused,
+        }
+
+
+session_layers = LayerCache()
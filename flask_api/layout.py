@@ -0,0 +1,165 @@
+import json
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+from fonts import fontPath
+
+# One JSON spec per page template, in full-resolution pixels; drop in a file to add a template
+LAYOUTS_DIR = os.getenv('LAYOUTS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'layouts'))
+DEFAULT_LAYOUT = 'a4'
+
+# Elements drawn over the background, in drawing order; each stays inside its box
+LAYER_NAMES = ('cover', 'palette', 'header', 'tracklist', 'footer')
+FONT_ROLES = ('title', 'subtitle', 'text', 'italic')
+
+# Compiled plans kept per process: a handful of layouts times the render tiers
+MAX_PLANS = 64
+
+
+@dataclass(slots=True, frozen=True)
+class RenderPlan:
+    """Every font, position and size a render needs for one layout at one scale, in pixels."""
+    layout: str
+    scale: float
+    size: tuple
+    fonts: dict
+    rule_ys: tuple
+    rule_x: int
+    rule_width: int
+    rule_thickness: int
+    cover_position: tuple
+    cover_size: tuple
+    palette_position: tuple
+    swatch_size: tuple
+    header_right: int
+    header_width: int
+    artist_y: int
+    album_y: int
+    tracklist_x: int
+    tracklist_top: int
+    tracklist_bottom: int
+    tracklist_width: int
+    tracklist_gutter: int
+    tracklist_margin: int
+    short_rows: int
+    footer_right: int
+    footer_width: int
+    scannable_y: int
+    scannable_scale: float
+    copyright_y: int
+    boxes: dict
+
+
+def scaled(value, scale):
+    """Scale a full-resolution length to the render scale, never below 1px."""
+    return max(1, round(value * scale))
+
+
+def compileLayout(name, spec, scale=1.0):
+    """Resolve a layout spec into the RenderPlan for one render scale."""
+    def px(value):
+        return scaled(value, scale)
+
+    rules, cover, palette = spec['rules'], spec['cover'], spec['palette']
+    header, tracklist, footer = spec['header'], spec['tracklist'], spec['footer']
+    return RenderPlan(
+        layout=name,
+        scale=scale,
+        size=tuple(px(length) for length in spec['size']),
+        fonts={role: (family, weight, px(size)) for role, (family, weight, size) in spec['fonts'].items()},
+        rule_ys=tuple(px(y) for y in rules['y']),
+        rule_x=px(rules['x']),
+        rule_width=px(rules['width']),
+        rule_thickness=px(rules['thickness']),
+        cover_position=(px(cover['x']), px(cover['y'])),
+        cover_size=(px(cover['size']), px(cover['size'])),
+        palette_position=(px(palette['x']), px(palette['y'])),
+        swatch_size=tuple(px(length) for length in palette['swatch']),
+        header_right=px(header['right']),
+        header_width=px(header['right']) - px(header['left']),
+        artist_y=px(header['artist_y']),
+        album_y=px(header['album_y']),
+        tracklist_x=px(tracklist['x']),
+        tracklist_top=px(tracklist['top']),
+        tracklist_bottom=px(tracklist['bottom']),
+        tracklist_width=px(tracklist['width']),
+        tracklist_gutter=px(tracklist['gutter']),
+        tracklist_margin=px(tracklist['margin']),
+        short_rows=tracklist['short_rows'],
+        footer_right=px(footer['right']),
+        footer_width=px(footer['right']) - px(footer['left']),
+        scannable_y=px(footer['scannable_y']),
+        scannable_scale=scale * footer['scannable_scale'],
+        copyright_y=px(footer['copyright_y']),
+        boxes={
+            # The cover fills its box exactly; every other element declares a box around its text
+            'cover': (px(cover['x']), px(cover['y']), px(cover['x']) + px(cover['size']), px(cover['y']) + px(cover['size'])),
+            **{layer: tuple(px(value) for value in spec[layer]['box']) for layer in LAYER_NAMES[1:]},
+        },
+    )
+
+
+def overlaps(box, other):
+    """Return whether two (left, top, right, bottom) boxes share any pixel."""
+    left, top, right, bottom = box
+    other_left, other_top, other_right, other_bottom = other
+    return left < other_right and other_left < right and top < other_bottom and other_top < bottom
+
+
+def ruleBands(plan):
+    """Return the box each rule is drawn in, its thickness rounded up on both sides of its y."""
+    half = (plan.rule_thickness + 1) // 2
+    return [(plan.rule_x - half, y - half, plan.rule_x + plan.rule_width + half, y + half) for y in plan.rule_ys]
+
+
+def validateLayout(name, spec):
+    """Raise ValueError if a spec is incomplete or its layer boxes could not be redrawn independently."""
+    try:
+        plan = compileLayout(name, spec)
+        for role in FONT_ROLES:
+            fontPath(*plan.fonts[role][:2])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid layout {name}: {e!r}")
+
+    width, height = plan.size
+    for i, layer in enumerate(LAYER_NAMES):
+        left, top, right, bottom = plan.boxes[layer]
+        if not (0 <= left < right <= width and 0 <= top < bottom <= height):
+            raise ValueError(f"Invalid layout {name}: {layer} box is outside the page")
+        for other in LAYER_NAMES[i + 1:]:
+            if overlaps(plan.boxes[layer], plan.boxes[other]):
+                raise ValueError(f"Invalid layout {name}: {layer} and {other} boxes overlap")
+        # Redrawing a layer clears its box to the background, which would erase a rule inside it
+        if any(overlaps(plan.boxes[layer], band) for band in ruleBands(plan)):
+            raise ValueError(f"Invalid layout {name}: {layer} box overlaps a rule")
+
+
+def loadLayouts(directory=LAYOUTS_DIR):
+    """Read and validate every *.json spec in directory, keyed by file name."""
+    layouts = {}
+    for file_name in sorted(os.listdir(directory)):
+        name, extension = os.path.splitext(file_name)
+        if extension != '.json':
+            continue
+        with open(os.path.join(directory, file_name), encoding='utf-8') as f:
+            spec = json.load(f)
+        validateLayout(name, spec)
+        layouts[name] = spec
+    return layouts
+
+
+LAYOUTS = loadLayouts()
+
+
+@lru_cache(maxsize=MAX_PLANS)
+def renderPlan(layout=DEFAULT_LAYOUT, scale=1.0):
+    """Return the compiled plan for a layout at a render scale, compiling it on first use."""
+    return compileLayout(layout, LAYOUTS[layout], scale)
+
+
+def layoutError(layout):
+    """Return why a layout name is invalid, or None."""
+    if layout not in LAYOUTS:
+        return f"Invalid layout: {layout}"
+    return None
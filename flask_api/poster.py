@@ -1,49 +1,53 @@
-import base64
-from PIL import Image, ImageDraw, ImageFont
-import math
+from PIL import Image, ImageDraw
+from fonts import getFont
+from palette import extractPalette
+from encoders import DEFAULT_FORMAT, TIER_PROFILES, encodePoster
+from scannables import scannableImage
+from covers import cover_variants, prepareImage, scaleImage
+from text_layout import fitText, layoutTracklist, textWidth
+from layout import DEFAULT_LAYOUT, LAYOUTS, renderPlan
 import sys
-import json
-from io import BytesIO
+import threading
+from collections import OrderedDict
 
-import requests
+# Render scale for each quality tier; layout maths and font sizes scale with it
+TIER_SCALES = {
+    'draft': 0.125,
+    'preview': 0.25,
+    'final': 1.0,
+}
+
+DEFAULT_BG_COLOR = 'DED8CE'
+MAX_BACKGROUNDS = 16
+
+# Finished static backgrounds keyed by (bg_color, layout, scale), least recently used first
+_backgrounds = OrderedDict()
+_backgrounds_lock = threading.Lock()
 
 def debug(message):
     print(f"DEBUG: {message}", file=sys.stderr)
 
 
-def color_distance(c1, c2):
-    # Calculate Euclidean distance between two RGB colors
-    return math.sqrt(sum((a - b) ** 2 for a, b in zip(c1, c2)))
-
 def hexToRGB(hex_color):
     hex_color = hex_color.lstrip('#')  # Remove '#' if it's present
     return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
 
-def pick_distinct_colors(palette, num_colors):
-    # Extract RGB tuples from the palette
-    colors = [(palette[i], palette[i+1], palette[i+2]) for i in range(0, len(palette), 3)]
-    
-    # Start with the first color
-    selected_colors = [colors[0]]
-    
-    for _ in range(1, num_colors):
-        next_color = max(colors, key=lambda c: min(color_distance(c, sc) for sc in selected_colors))
-        selected_colors.append(next_color)
-        colors.remove(next_color)
-    
-    return selected_colors
-
-
-def resizeAndPasteImage(image, poster, size, position):
+def posterFont(plan, role):
+    """Return the cached font for a text role in a render plan."""
+    return getFont(*plan.fonts[role])
+
+def posterFontSpecs():
+    """Return the (family, weight, size) of every role in every layout at every tier, for warming."""
+    return {spec for layout in LAYOUTS for scale in TIER_SCALES.values() for spec in renderPlan(layout, scale).fonts.values()}
+
+def resizeAndPasteImage(image, poster, size, position, quality='final'):
     """Resize the image and paste it onto the poster."""
-    img_resized = image.resize(size)
+    img_resized = scaleImage(prepareImage(image, size), size, quality)
     poster.paste(img_resized, position)
     return img_resized
 
-def drawLines(draw, y_positions, line_thickness=15, color=(0, 0, 0)):
+def drawLines(draw, y_positions, line_thickness, x_start, width, color=(0, 0, 0)):
     """Draw lines at specified positions."""
-    width = 2120
-    x_start = 180
     for y_position in y_positions:
         draw.line([(x_start, y_position), (x_start + width, y_position)], fill=color, width=line_thickness)
 
@@ -53,80 +57,149 @@ def drawColorPalette(draw, distinct_colors, start_x, start_y, block_width, block
         block_x = start_x + block_width * i
         draw.rectangle([block_x, start_y, block_x + block_width, start_y + block_height], fill=color)
 
-def rightAlignText(draw, text, font, right_align_x, y_position, color=(0, 0, 0)):
-    """Draw right-aligned text."""
-    text_bbox = draw.textbbox((0, 0), text, font=font)
-    text_width = text_bbox[2] - text_bbox[0]
-    text_x = right_align_x - text_width
+def rightAlignText(draw, text, font, right_align_x, y_position, color=(0, 0, 0), max_width=None):
+    """Draw right-aligned text, shrunk to fit max_width if given."""
+    if max_width is not None:
+        font, text = fitText(font, text, max_width)
+    text_x = right_align_x - textWidth(font, text)
     draw.text((text_x, y_position), text, font=font, fill=color)
 
-def calculateTracklistSpacing(start_y, end_y, num_tracks):
-    """Calculate dynamic spacing for the tracklist."""
-    if num_tracks < 5:
-        extra_margin = (5 - num_tracks) * 200
-        start_y += extra_margin // 2
-        end_y -= extra_margin // 2
-    available_height = end_y - start_y
-    return available_height // num_tracks, start_y
-
-def drawTracklist(draw, tracklist, font, start_y, end_y, color=(0, 0, 0)):
-    """Draw the tracklist with dynamic spacing."""
-    debug(tracklist[0])
-    tracklist_spacing, tracklist_y_position = calculateTracklistSpacing(start_y, end_y, len(tracklist))
-    for track in tracklist:
-        draw.text((180, tracklist_y_position), track, font=font, fill=color)
-        tracklist_y_position += tracklist_spacing
-
-def generatePoster(bg_color, image, album_name, artist_name, tracklist, scannable, copyright_text):
-    """Main function to generate the poster."""
-    # Create the poster
-    rgb_color = hexToRGB(bg_color)
-    poster = Image.new('RGB', (2480, 3508), rgb_color)
+def drawTracklist(draw, tracklist, font, start_y, end_y, x, margin, width, gutter, short_rows, color=(0, 0, 0)):
+    """Draw the tracklist with dynamic spacing, shrunk and split into columns to fit width."""
+    layout = layoutTracklist(tracklist, font, x, start_y, end_y, width, margin, gutter, short_rows)
+    for line in layout.lines:
+        draw.text((line.x, line.y), line.text, font=layout.font, fill=color)
+
+def renderBackground(bg_color, layout, scale=1.0):
+    """Render the static background for a colour, layout and render scale."""
+    plan = renderPlan(layout, scale)
+    background = Image.new('RGB', plan.size, hexToRGB(bg_color))
+    drawLines(ImageDraw.Draw(background), plan.rule_ys, plan.rule_thickness, x_start=plan.rule_x, width=plan.rule_width)
+    return background
+
+def getBackground(bg_color, layout=DEFAULT_LAYOUT, scale=1.0):
+    """Return a fresh copy of the cached static background to draw on."""
+    key = (bg_color.lstrip('#').upper(), layout, scale)
+    with _backgrounds_lock:
+        background = _backgrounds.get(key)
+        if background is not None:
+            _backgrounds.move_to_end(key)
+    if background is None:
+        background = renderBackground(*key)
+        with _backgrounds_lock:
+            _backgrounds[key] = background
+            # Evict the oldest templates, but always keep the default colour warm
+            for old_key in list(_backgrounds):
+                if len(_backgrounds) <= MAX_BACKGROUNDS:
+                    break
+                if old_key[:2] != (DEFAULT_BG_COLOR, DEFAULT_LAYOUT):
+                    del _backgrounds[old_key]
+    return background.copy()
+
+def warmBackgrounds(bg_colors=(DEFAULT_BG_COLOR,), layout=DEFAULT_LAYOUT):
+    """Render the backgrounds for the given colours at every tier ahead of the first request."""
+    for bg_color in bg_colors:
+        for scale in TIER_SCALES.values():
+            getBackground(bg_color, layout, scale)
+
+def drawCoverLayer(poster, draw, plan, quality, inputs):
+    resizeAndPasteImage(inputs['image'], poster, plan.cover_size, plan.cover_position, quality)
+
+def drawPaletteLayer(poster, draw, plan, quality, inputs):
+    drawColorPalette(draw, inputs['palette'], *plan.palette_position, *plan.swatch_size)
+
+def drawHeaderLayer(poster, draw, plan, quality, inputs):
+    # Right-align artist and album name, shrunk to fit the header width
+    rightAlignText(draw, inputs['artist_name'], posterFont(plan, 'subtitle'), plan.header_right, plan.artist_y,
+                   max_width=plan.header_width)
+    rightAlignText(draw, inputs['album_name'], posterFont(plan, 'title'), plan.header_right, plan.album_y,
+                   max_width=plan.header_width)
+
+def drawTracklistLayer(poster, draw, plan, quality, inputs):
+    drawTracklist(draw, inputs['tracklist'], posterFont(plan, 'text'), plan.tracklist_top, plan.tracklist_bottom,
+                  x=plan.tracklist_x, margin=plan.tracklist_margin, width=plan.tracklist_width,
+                  gutter=plan.tracklist_gutter, short_rows=plan.short_rows)
+
+def drawFooterLayer(poster, draw, plan, quality, inputs):
+    scannable = inputs['scannable']
+    position = (plan.footer_right - scannable.width, plan.scannable_y)
+    poster.paste(scannable, position, scannable if scannable.mode == 'RGBA' else None)
+    rightAlignText(draw, inputs['copyright_text'], posterFont(plan, 'italic'), plan.footer_right, plan.copyright_y,
+                   max_width=plan.footer_width)
+
+# Layers drawn over the background, in drawing order
+LAYERS = {
+    'cover': drawCoverLayer,
+    'palette': drawPaletteLayer,
+    'header': drawHeaderLayer,
+    'tracklist': drawTracklistLayer,
+    'footer': drawFooterLayer,
+}
+
+def composePoster(bg_color, image, album_name, artist_name, tracklist, scannable, copyright_text, quality='final', scale=None,
+                  scannable_ready=False, palette=None, layout=DEFAULT_LAYOUT):
+    """Lay out the poster and return it as a PIL image.
+
+    quality picks the tier ('draft', 'preview' or 'final'); the tier sets the
+    render scale unless scale is given explicitly. layout names the page
+    template (see layout.py). scannable_ready means the scannable is already
+    an RGBA image at the plan's scannable scale (see scannableImage), and
+    palette, if given, is the cover's precomputed swatches.
+    """
+    if scale is None:
+        scale = TIER_SCALES[quality]
+    plan = renderPlan(layout, scale)
+
+    # Decode and convert the cover once for both the resize and the palette
+    image = prepareImage(image, plan.cover_size)
+    if palette is None:
+        palette = extractPalette(image, num_colors=5, palette_size=20)
+    if not scannable_ready and plan.scannable_scale != 1.0:
+        scannable = scannable.resize((max(1, round(scannable.width * plan.scannable_scale)),
+                                      max(1, round(scannable.height * plan.scannable_scale))))
+
+    # Start from a copy of the pre-rendered background (canvas and lines), then draw each layer over it
+    poster = getBackground(bg_color, layout, scale)
     draw = ImageDraw.Draw(poster)
-
-    # Resize and paste the image
-    resizeAndPasteImage(image, poster, (2120, 2120), (180, 130))
-
-    # Draw lines
-    drawLines(draw, [70, 3450])
-
-    # Generate color palette
-    paletted = image.convert('P', palette=Image.ADAPTIVE, colors=20)
-    palette = paletted.getpalette()
-    distinct_colors = pick_distinct_colors(palette, 5)
-
-    # Draw color palette
-    drawColorPalette(draw, distinct_colors, start_x=1240, start_y=2400, block_width=210, block_height=40)
-    
-    bold_path = "./fonts/kollektif/Kollektif-Bold.ttf"
-    heavy_path = "./fonts/kollektif/Kollektif-Bold.ttf"
-    regular_path = "./fonts/kollektif/Kollektif.ttf"
-    italic_path = "./fonts/kollektif/Kollektif-Italic.ttf"
-    
-    font_title = ImageFont.truetype(heavy_path, 120, encoding="unic")
-    font_subtitle = ImageFont.truetype(bold_path, 120, encoding="unic")
-    font_text = ImageFont.truetype(regular_path, 40, encoding="unic")
-    font_italic = ImageFont.truetype(italic_path, 30, encoding="unic")
-
-    # Right-align artist and album name
-    right_align_x = 2480 - 180  # Define the rightmost alignment position
-    rightAlignText(draw, artist_name, font_subtitle, right_align_x, 2550)
-    rightAlignText(draw, album_name, font_title, right_align_x, 2740)
-
-    # Draw tracklist
-    drawTracklist(draw, tracklist, font_text, start_y=2330, end_y=3420)
-
-    # Draw scannable
-    scannable_width, scannable_height = scannable.size
-    poster.paste(scannable, (right_align_x - scannable_width, 3230))
-
-
-    # Draw copyright text
-    rightAlignText(draw, copyright_text, font_italic, right_align_x, 3380)
-
-    img_io = BytesIO()
-    poster.save(img_io, 'JPEG')
-    img_io.seek(0)
-    
-    # Return the image as bytes
-    return img_io.read()
+    inputs = {
+        'image': image,
+        'palette': palette,
+        'album_name': album_name,
+        'artist_name': artist_name,
+        'tracklist': tracklist,
+        'scannable': scannable,
+        'copyright_text': copyright_text,
+    }
+    for draw_layer in LAYERS.values():
+        draw_layer(poster, draw, plan, quality, inputs)
+    return poster
+
+
+def generatePoster(bg_color, image, album_name, artist_name, tracklist, scannable, copyright_text, quality='final',
+                   scale=None, format=DEFAULT_FORMAT, profile=None, layout=DEFAULT_LAYOUT):
+    """Main function to generate the poster; returns it encoded in format.
+
+    profile picks the encoder settings ('web' or 'print') and defaults to the
+    one for the quality tier.
+    """
+    poster = composePoster(bg_color, image, album_name, artist_name, tracklist, scannable, copyright_text, quality, scale,
+                           layout=layout)
+    return encodePoster(poster, format, profile or TIER_PROFILES[quality])
+
+
+def renderPoster(fields, image_source, scannable_source):
+    """Open the cover and scannable (bytes or streams) and render a poster from request fields."""
+    if not isinstance(image_source, bytes):
+        image_source = image_source.read()
+    if not isinstance(scannable_source, bytes):
+        scannable_source = scannable_source.read()
+    quality = fields['quality']
+    layout = fields.get('layout', DEFAULT_LAYOUT)
+    plan = renderPlan(layout, TIER_SCALES[quality])
+    # Previews re-render the same cover and scannable over and over; reuse their decoded, scaled copies
+    image, palette = cover_variants.get(image_source, plan.cover_size, quality)
+    scannable = scannableImage(scannable_source, plan.scannable_scale)
+    poster = composePoster(fields['bg_color'], image, fields['album_name'], fields['artist_name'], fields['tracklist'],
+                           scannable, fields['copyright_text'], quality, scannable_ready=True, palette=palette,
+                           layout=layout)
+    return encodePoster(poster, fields.get('format', DEFAULT_FORMAT), fields.get('profile') or TIER_PROFILES[quality])
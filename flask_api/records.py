@@ -0,0 +1,52 @@
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class AlbumSummary:
+    """One album in a search result."""
+    id: str
+    album_name: str
+    artist_name: str
+    cover_url: str | None
+
+    @classmethod
+    def fromPayload(cls, album):
+        """Build a summary from a simplified album object in a search response."""
+        return cls(
+            id=album['id'],
+            album_name=album['name'],
+            artist_name=album['artists'][0]['name'] if album['artists'] else "Unknown Artist",
+            cover_url=album['images'][0]['url'] if album['images'] else None,
+        )
+
+    def toJson(self):
+        return {"id": self.id, "album_name": self.album_name, "artist_name": self.artist_name, "cover_url": self.cover_url}
+
+
+@dataclass(slots=True)
+class Album:
+    """The fields a poster needs from a full album object."""
+    id: str
+    name: str
+    artist_name: str
+    cover_url: str
+    tracklist: list
+    copyright: str
+
+    @classmethod
+    def fromPayload(cls, album):
+        """Build an album from a parsed GET /albums/{id} payload."""
+        return cls(
+            id=album['id'],
+            name=album['name'],
+            artist_name=album['artists'][0]['name'],
+            cover_url=album['images'][0]['url'],
+            tracklist=[song['name'] for song in album['tracks']['items']],
+            copyright=album['copyrights'][0]['text'] if album['copyrights'] else '',
+        )
+
+    def toJson(self):
+        # Field names match what the get-info route has always returned
+        return {"album-name": self.name, "artist-name": self.artist_name, "cover-url": self.cover_url,
+                "tracklist": self.tracklist, "copyright": self.copyright}
+
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# Memory budget for encoded posters, and an optional directory for the disk tier
+RENDER_CACHE_BYTES = int(os.getenv('RENDER_CACHE_BYTES', 256 * 1024 * 1024))
+RENDER_CACHE_DIR = os.getenv('RENDER_CACHE_DIR')
+
+
+def renderKey(fields, *blobs):
+    """Hash the normalized render inputs and raw image bytes into a cache key."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(fields, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+    for blob in blobs:
+        # Hash each blob separately so concatenations cannot collide
+        digest.update(hashlib.sha256(blob).digest())
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """LRU of encoded posters bounded by total bytes, with an optional disk tier."""
+
+    def __init__(self, max_bytes=RENDER_CACHE_BYTES, directory=RENDER_CACHE_DIR):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def _remember(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self._bytes -= len(old)
+
+    def get(self, key):
+        """Return the cached bytes for key, or None."""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+
+        if self.directory:
+            try:
+                with open(self._path(key), 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                pass
+            else:
+                self.disk_hits += 1
+                self._remember(key, data)
+                return data
+
+        self.misses += 1
+        return None
+
+    def put(self, key, data):
+        """Store encoded bytes under key in memory and, if enabled, on disk."""
+        self._remember(key, data)
+        if self.directory and not os.path.exists(self._path(key)):
+            # Write then rename so readers never see a partial file
+            tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+
+    def stats(self):
+        """Return hit/miss counters and memory usage."""
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+        }
@@ -0,0 +1,264 @@
+import asyncio
+import functools
+import math
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+# Rough peak memory of one render process: its layer pages, cover variants, backgrounds and fonts
+RENDER_PROCESS_BYTES = int(os.getenv('RENDER_PROCESS_BYTES', 512 * 1024 * 1024))
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+
+def _readCgroup(root, *names):
+    """Return the first of the named cgroup files that exists, stripped, or None."""
+    for name in names:
+        try:
+            with open(os.path.join(root, name)) as f:
+                return f.read().strip()
+        except OSError:
+            continue
+    return None
+
+
+def availableCpus(root=CGROUP_ROOT):
+    """CPUs this process may use: its affinity mask, capped by a cgroup v2 or v1 CPU quota."""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    quota = _readCgroup(root, 'cpu.max')
+    if quota is not None:
+        limit, period = quota.split()
+    else:
+        limit, period = _readCgroup(root, 'cpu/cpu.cfs_quota_us'), _readCgroup(root, 'cpu/cpu.cfs_period_us')
+    # 'max' (v2) and -1 (v1) mean no quota
+    if limit not in (None, 'max', '-1') and period:
+        cpus = min(cpus, math.ceil(int(limit) / int(period)))
+    return max(1, cpus)
+
+
+def availableMemory(root=CGROUP_ROOT):
+    """Bytes of memory the cgroup allows, or None without a limit."""
+    limit = _readCgroup(root, 'memory.max', 'memory/memory.limit_in_bytes')
+    if limit is None or limit == 'max':
+        return None
+    # v1 reports no limit as a huge page-aligned number
+    return int(limit) if int(limit) < 1 << 60 else None
+
+
+def defaultWorkers(root=CGROUP_ROOT):
+    """One render process per available CPU, as many as the memory limit has room for."""
+    workers = availableCpus(root)
+    memory = availableMemory(root)
+    if memory is not None:
+        workers = min(workers, memory // RENDER_PROCESS_BYTES)
+    return max(1, workers)
+
+
+# Render processes, jobs allowed to wait for one, and the per-job time limit in seconds
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS') or defaultWorkers())
+RENDER_QUEUE = int(os.getenv('RENDER_QUEUE', RENDER_WORKERS * 2))
+RENDER_TIMEOUT = float(os.getenv('RENDER_TIMEOUT', 30))
+RENDER_START_METHOD = os.getenv('RENDER_START_METHOD', 'forkserver')
+
+
+class RenderPoolFull(Exception):
+    """Raised when every worker is busy and the queue is full."""
+
+    def __init__(self, retry_after):
+        super().__init__("Render queue is full")
+        self.retry_after = retry_after
+
+
+class RenderTimeout(Exception):
+    """Raised when a render runs past its time limit."""
+
+
+def _onAlarm(signum, frame):
+    raise RenderTimeout("Render time limit exceeded")
+
+
+def _initWorker():
+    # Each worker loads fonts and background templates once, before its first job
+    from fonts import warmFonts
+    from poster import posterFontSpecs, warmBackgrounds
+    warmFonts(posterFontSpecs())
+    warmBackgrounds()
+    signal.signal(signal.SIGALRM, _onAlarm)
+
+
+def _workerCacheStats():
+    """Counters of the caches that live in a render process."""
+    from covers import cover_variants
+    from fonts import fontCacheStats
+    from layers import session_layers
+    from text_layout import measureCacheStats
+    return {
+        'fonts': fontCacheStats(),
+        'cover_variants': cover_variants.stats(),
+        'measurements': measureCacheStats(),
+        'layers': session_layers.stats(),
+    }
+
+
+def _renderJob(fields, image_bytes, scannable_bytes, session, timeout):
+    """Worker side of RenderPool.submit: return (poster bytes, seconds, cache stats), interrupted after timeout seconds."""
+    from layers import session_layers
+    from poster import renderPoster
+    started_at = time.perf_counter()
+    # Jobs run on the worker's main thread, so an interval timer can interrupt them
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        if session:
+            poster_bytes = session_layers.render(session, fields, image_bytes, scannable_bytes)
+        else:
+            poster_bytes = renderPoster(fields, image_bytes, scannable_bytes)
+        return poster_bytes, time.perf_counter() - started_at, _workerCacheStats()
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class RenderPool:
+    """Bounded pool of render processes.
+
+    At most workers + max_queued jobs are accepted at once; submit() raises
+    RenderPoolFull beyond that instead of letting requests pile up. Inputs
+    cross the process boundary as encoded image bytes, never as PIL images.
+
+    Each worker process has its own executor. Renders for an editing session
+    always go to the same worker, which keeps that session's layers (see
+    layers.py); other renders go to the least busy worker.
+    """
+
+    def __init__(self, workers=RENDER_WORKERS, max_queued=RENDER_QUEUE, timeout=RENDER_TIMEOUT):
+        self.workers = workers
+        self.max_pending = workers + max_queued
+        self.timeout = timeout
+        self._executors = [None] * workers
+        self._lock = threading.Lock()
+        self._pending = 0
+        # Unfinished jobs per worker, and each worker's cache counters as of its last job
+        self._queued = [0] * workers
+        self._worker_stats = [None] * workers
+        # Moving average of job duration, used to suggest a Retry-After
+        self._average_seconds = 1.0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def _getExecutor(self, index):
+        # Created on first use so each gunicorn worker starts its own processes after forking
+        if self._executors[index] is None:
+            self._executors[index] = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context(RENDER_START_METHOD),
+                initializer=_initWorker,
+            )
+        return self._executors[index]
+
+    def _pickWorker(self, session):
+        if session:
+            return zlib.crc32(session.encode('utf-8')) % self.workers
+        return min(range(self.workers), key=self._queued.__getitem__)
+
+    def retryAfter(self):
+        """Seconds until a queued job is likely to start, rounded up."""
+        return max(1, math.ceil(self._average_seconds * self._pending / self.workers))
+
+    def _finished(self, index, future):
+        with self._lock:
+            self._pending -= 1
+            self._queued[index] -= 1
+            if future.cancelled() or future.exception() is not None:
+                return
+            _, seconds, self._worker_stats[index] = future.result()
+            self.completed += 1
+            self._average_seconds = 0.8 * self._average_seconds + 0.2 * seconds
+
+    def _submitJob(self, index, *args):
+        try:
+            return self._getExecutor(index).submit(_renderJob, *args, self.timeout)
+        except BrokenProcessPool:
+            # The worker died (e.g. out of memory); start a fresh one for this and later jobs
+            self._executors[index].shutdown(wait=False)
+            self._executors[index] = None
+            return self._getExecutor(index).submit(_renderJob, *args, self.timeout)
+
+    def submit(self, fields, image_bytes, scannable_bytes, session=None):
+        """Queue a render and return its Future for result(), or raise RenderPoolFull.
+
+        session, if given, names the editing session the render belongs to.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise RenderPoolFull(self.retryAfter())
+            index = self._pickWorker(session)
+            self._pending += 1
+            self._queued[index] += 1
+            try:
+                future = self._submitJob(index, fields, image_bytes, scannable_bytes, session)
+            except BaseException:
+                self._pending -= 1
+                self._queued[index] -= 1
+                raise
+            # Jobs on this worker, counting this one; session pinning can queue them all on one worker
+            future.queue_depth = self._queued[index]
+        future.add_done_callback(functools.partial(self._finished, index))
+        return future
+
+    def _deadline(self, future):
+        # The worker interrupts each job after timeout and runs its queue in order, so past this
+        # deadline (plus one timeout for starting the process) the worker is stuck
+        return self.timeout * (future.queue_depth + 1)
+
+    def _timedOut(self):
+        self.timeouts += 1
+        return RenderTimeout(f"Render took longer than {self.timeout:g}s")
+
+    def result(self, future):
+        """Wait for a submitted render and return the poster, raising RenderTimeout if it overruns."""
+        try:
+            poster_bytes, _, _ = future.result(timeout=self._deadline(future))
+            return poster_bytes
+        except (RenderTimeout, FutureTimeoutError):
+            raise self._timedOut()
+        except Exception:
+            self.failures += 1
+            raise
+
+    async def awaitResult(self, future):
+        """Async result(): await the render on the event loop instead of blocking a thread on it."""
+        try:
+            poster_bytes, _, _ = await asyncio.wait_for(asyncio.wrap_future(future), self._deadline(future))
+            return poster_bytes
+        except (RenderTimeout, asyncio.TimeoutError):
+            raise self._timedOut()
+        except Exception:
+            self.failures += 1
+            raise
+
+    def render(self, fields, image_bytes, scannable_bytes, session=None):
+        """Render in a worker process and return the encoded poster."""
+        return self.result(self.submit(fields, image_bytes, scannable_bytes, session))
+
+    def workerStats(self):
+        """Return the cache counters each worker reported with its last job (None before its first)."""
+        return list(self._worker_stats)
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'pending': self._pending,
+            'max_pending': self.max_pending,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts,
+            'failures': self.failures,
+            'average_ms': round(self._average_seconds * 1000),
+        }
@@ -0,0 +1,104 @@
+# Scannable code images, fetched once per (uri, colours, size) and kept in memory and on disk.
+# usage: SCANNABLE_CACHE_DIR=/var/cache/scannables python scannables.py [albums.txt] [--bg-color DED8CE]
+#        (pre-warms the disk cache the servers read)
+import argparse
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from PIL import Image
+
+from http_client import fetchBytes, getExecutor
+from render_cache import RenderCache
+
+SCANNABLES_URL = os.getenv('SCANNABLES_URL', 'https://scannables.scdn.co')
+
+# Budget for encoded PNGs in memory, and an optional disk tier shared by every worker that sets
+# the same directory; nothing evicts it, so point it at storage you manage
+SCANNABLE_CACHE_BYTES = int(os.getenv('SCANNABLE_CACHE_BYTES', 32 * 1024 * 1024))
+SCANNABLE_CACHE_DIR = os.getenv('SCANNABLE_CACHE_DIR')
+
+# Decoded RGBA copies kept per process, keyed by (PNG digest, render scale)
+MAX_SCANNABLE_IMAGES = int(os.getenv('MAX_SCANNABLE_IMAGES', 256))
+
+scannable_cache = RenderCache(SCANNABLE_CACHE_BYTES, SCANNABLE_CACHE_DIR)
+
+_images = OrderedDict()
+_images_lock = threading.Lock()
+
+
+def getScannableUrl(id, bg_color, code_color='black', size=512, format='png'):
+    """Return the scannable code image URL for an album."""
+    return f"{SCANNABLES_URL}/uri/plain/{format}/{bg_color}/{code_color}/{size}/spotify:album:{id}"
+
+
+def scannableKey(id, bg_color, code_color='black', size=512):
+    """Cache key for the code image; it depends on nothing but these parameters."""
+    return hashlib.sha256(f"spotify:album:{id}|{bg_color.lower()}|{code_color}|{size}".encode('utf-8')).hexdigest()
+
+
+def fetchScannable(id, bg_color, code_color='black', size=512):
+    """Return the scannable PNG bytes for an album, from the cache or the code service."""
+    key = scannableKey(id, bg_color, code_color, size)
+    data = scannable_cache.get(key)
+    if data is None:
+        data = fetchBytes(getScannableUrl(id, bg_color, code_color, size))
+        scannable_cache.put(key, data)
+    return data
+
+
+def prewarmScannables(ids, bg_color, code_color='black', size=512):
+    """Fetch the scannables of many albums concurrently so later renders hit the cache.
+
+    Returns how many are now cached; failures are reported and skipped.
+    """
+    def prewarm(id):
+        try:
+            fetchScannable(id, bg_color, code_color, size)
+            return True
+        except Exception as e:
+            print(f"{id}: {e}", file=sys.stderr)
+            return False
+    return sum(getExecutor().map(prewarm, ids))
+
+
+def scannableImage(data, scale=1.0):
+    """Decode scannable PNG bytes into an RGBA image at the render scale, once per process."""
+    key = (hashlib.sha256(data).digest(), scale)
+    with _images_lock:
+        image = _images.get(key)
+        if image is not None:
+            _images.move_to_end(key)
+            return image
+
+    image = Image.open(BytesIO(data)).convert('RGBA')
+    if scale != 1.0:
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))))
+
+    with _images_lock:
+        _images[key] = image
+        while len(_images) > MAX_SCANNABLE_IMAGES:
+            _images.popitem(last=False)
+    return image
+
+
+def main():
+    from poster import DEFAULT_BG_COLOR
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input', nargs='?', type=argparse.FileType('r'), default=sys.stdin,
+                        help='file of album ids, one per line (default: stdin)')
+    parser.add_argument('--bg-color', default=DEFAULT_BG_COLOR)
+    args = parser.parse_args()
+    if not SCANNABLE_CACHE_DIR:
+        parser.error("set SCANNABLE_CACHE_DIR to the directory the servers read")
+
+    ids = [line.strip() for line in args.input if line.strip() and not line.startswith('#')]
+    cached = prewarmScannables(ids, args.bg_color)
+    print(f"{cached}/{len(ids)} scannables cached in {SCANNABLE_CACHE_DIR}")
+
+
+if __name__ == '__main__':
+    main()
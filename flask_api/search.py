@@ -1,48 +1,65 @@
 # search_script.py
 
-import base64
-import json
 import os
+import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
 from dotenv import load_dotenv
-from requests import post, get
+from auth import TokenManager
+from http_client import getExecutor, getSession
+from scannables import fetchScannable
+from covers import fetchCover
+from ttl_cache import TTLCache
+from records import Album, AlbumSummary
+from serialize import dumps, loads
 
-def debug(message):
-    print(f"DEBUG: {message}", file=sys.stderr)
+load_dotenv()
 
+# Upstream endpoints, overridable so the stub server can stand in for them
+ACCOUNTS_URL = os.getenv('SPOTIFY_ACCOUNTS_URL', 'https://accounts.spotify.com/api')
+API_URL = os.getenv('SPOTIFY_API_URL', 'https://api.spotify.com/v1')
 
-def getToken():
-    load_dotenv()
-    auth_string = os.getenv('ID') + ":" + os.getenv('SEC')
-    auth_bytes = auth_string.encode("utf-8")
-    auth_base64 = str(base64.b64encode(auth_bytes), "utf-8")
+# One cached access token per worker, shared by every request
+token_manager = TokenManager(f"{ACCOUNTS_URL}/token", 'ID', 'SEC', session=getSession())
 
-    url = "https://accounts.spotify.com/api/token"
-    headers = {
-        "Authorization": "Basic " + auth_base64,
-        "Content-Type": "application/x-www-form-urlencoded"
-    }
+# Album records barely change; search results go stale sooner
+ALBUM_CACHE_TTL = int(os.getenv('ALBUM_CACHE_TTL', 24 * 60 * 60))
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', 10 * 60))
+album_cache = TTLCache('albums', ALBUM_CACHE_TTL, int(os.getenv('ALBUM_CACHE_SIZE', 2048)),
+                       encode=asdict, decode=lambda data: Album(**data))
+search_cache = TTLCache('searches', SEARCH_CACHE_TTL, int(os.getenv('SEARCH_CACHE_SIZE', 1024)),
+                        encode=lambda albums: [asdict(album) for album in albums],
+                        decode=lambda data: [AlbumSummary(**album) for album in data])
 
-    data = {"grant_type": "client_credentials"}
-    result = post(url, headers=headers, data=data)
+# The multi-album endpoint accepts at most this many ids per request
+ALBUMS_PER_REQUEST = 20
+
+# Album ids are 22 base62 characters; upstream rejects a whole multi-album request over one bad id
+ALBUM_ID_PATTERN = r'[0-9A-Za-z]{22}'
+
+# Extra tracklist pages fetched at once, across all albums in this worker
+TRACK_PAGE_CONCURRENCY = int(os.getenv('TRACK_PAGE_CONCURRENCY', 4))
+_page_executor = ThreadPoolExecutor(max_workers=TRACK_PAGE_CONCURRENCY, thread_name_prefix='tracks')
+
+
+def debug(message):
+    print(f"DEBUG: {message}", file=sys.stderr)
 
-    if result.status_code == 200:
-        return result.json()['access_token']
-    else:
-        print(f"Error: {result.status_code}, result: {result.text}")
-        result.raise_for_status()
+
+def getToken():
+    return token_manager.getToken()
 
 def getAuthHeader(token):
     return {"Authorization": "Bearer " + token}
 
-def search(token, type, input, limit):
-    url = 'https://api.spotify.com/v1/search'
-    headers = getAuthHeader(token)
+def search(type, input, limit):
+    url = f"{API_URL}/search"
     query = f"?q={input}&type={type}&limit={limit}"
-    result = get(url + query, headers=headers)
+    result = token_manager.authorizedGet(url + query)
     
     if result.status_code == 200:
-        json_result = result.json()[type+'s']['items']
+        json_result = loads(result.content)[type+'s']['items']
         return json_result if json_result else None
     else:
         print(f"Error: {result.status_code}, result: {result.text}")
@@ -57,62 +74,157 @@ def getArtistNames(search_result):
 def getImages(search_result):
     return [result['images'][0]['url'] for result in search_result if result['images']]
 
-def getSearchResultAsJson(query, limit=8):
-    token = getToken()
-    search_result = search(token, 'album', query, limit)
+def loadSearchResults(query, limit):
+    search_result = search('album', query, limit)
     
     if search_result:
-        albums_data = []
-        
-        for album in search_result:
-            album_data = {
-                "id": album['id'],
-                "album_name": album['name'],
-                "artist_name": album['artists'][0]['name'] if album['artists'] else "Unknown Artist",
-                "cover_url": album['images'][0]['url'] if album['images'] else None
-
-            }
-            albums_data.append(album_data)
-        
-        return json.dumps({"albums": albums_data})
-    
-    # Return structured error if no results
-    return json.dumps({"error": {"message": "No results found.", "query": query}})
+        return [AlbumSummary.fromPayload(album) for album in search_result]
+    return None
 
 
-def getAlbumInfo(id):
-    album_name = ''
-    artist_name = ''
-    cover_url = ''
-    tracklist = []
-    copyright = ''
+def searchAlbums(query, limit=8):
+    """Return the album summaries for a query, served from the search cache when fresh."""
+    key = f"{limit}:{query.strip().lower()}"
+    return search_cache.getOrLoad(key, lambda: loadSearchResults(query, limit))
 
-    token = getToken()
-        
-    url = f"https://api.spotify.com/v1/albums/{id}"
-    headers = getAuthHeader(token)
-    response = get(url, headers=headers)
 
-    if response.status_code == 200:
-        album_name = response.json()['name']
+def getSearchResult(query, limit=8):
+    """Return the search response body: album summaries, or a structured error."""
+    # A missing or blank query has no results, and no cache key
+    albums_data = searchAlbums(query, limit) if query and query.strip() else None
+    if albums_data:
+        return {"albums": albums_data}
+    
+    # Return structured error if no results
+    return {"error": {"message": "No results found.", "query": query}}
+
+
+def getSearchResultAsJson(query, limit=8):
+    return dumps(getSearchResult(query, limit))
+
+
+def fetchAlbumInfo(id):
+    """Return the Album record for an id, or None if the lookup fails.
+
+    Records are served from the album cache; concurrent misses share one upstream call.
+    """
+    return album_cache.getOrLoad(id, lambda: loadAlbumInfo(id))
+
+
+def loadAlbumInfo(id):
+    url = f"{API_URL}/albums/{id}"
+    response = token_manager.authorizedGet(url)
+
+    if response.status_code != 200:
+        return None
+
+    # Parse the payload once, tracklist included
+    payload = loads(response.content)
+    album = Album.fromPayload(payload)
+    album.tracklist.extend(fetchRemainingTracks(id, payload['tracks']))
+    return album
+
+
+def fetchTracksPage(id, offset, limit):
+    """Return the track names of one page of an album's tracklist."""
+    url = f"{API_URL}/albums/{id}/tracks?offset={offset}&limit={limit}"
+    response = token_manager.authorizedGet(url)
+    if response.status_code != 200:
+        print(f"Error: {response.status_code}, result: {response.text}")
+        response.raise_for_status()
+    return [song['name'] for song in loads(response.content)['items']]
+
+
+def fetchRemainingTracks(id, first_page):
+    """Fetch every tracklist page after the first concurrently and return the names in order."""
+    if not first_page.get('next'):
+        return []
+
+    # The first page tells us the total, so every remaining offset is known up front
+    limit = first_page['limit']
+    start = first_page['offset'] + len(first_page['items'])
+    offsets = range(start, first_page['total'], limit)
+    pages = _page_executor.map(lambda offset: fetchTracksPage(id, offset, limit), offsets)
+    return [name for page in pages for name in page]
+
+
+def loadAlbumsChunk(ids):
+    """Fetch up to ALBUMS_PER_REQUEST albums with one request and return {id: Album}."""
+    url = f"{API_URL}/albums?ids={','.join(ids)}"
+    response = token_manager.authorizedGet(url)
+    if response.status_code != 200:
+        print(f"Error: {response.status_code}, result: {response.text}")
+        response.raise_for_status()
+
+    albums = {}
+    for payload in loads(response.content)['albums']:
+        # Unknown ids come back as null
+        if payload is None:
+            continue
+        album = Album.fromPayload(payload)
+        album.tracklist.extend(fetchRemainingTracks(album.id, payload['tracks']))
+        albums[album.id] = album
+    return albums
+
+
+def isAlbumId(id):
+    return isinstance(id, str) and re.fullmatch(ALBUM_ID_PATTERN, id) is not None
+
+
+def fetchAlbums(ids, errors=None):
+    """Return {id: Album} for many ids, fetching cache misses in concurrent chunks of 20.
+
+    Ids the upstream API does not know are left out of the result. If errors
+    is a dict, a chunk that fails records why against each of its ids there
+    instead of raising.
+    """
+    albums = {}
+    missing = []
+    for id in dict.fromkeys(ids):
+        album = album_cache.get(id)
+        if album is not None:
+            albums[id] = album
+        else:
+            missing.append(id)
+
+    chunks = [missing[i:i + ALBUMS_PER_REQUEST] for i in range(0, len(missing), ALBUMS_PER_REQUEST)]
+    futures = [(chunk, getExecutor().submit(loadAlbumsChunk, chunk)) for chunk in chunks]
+    for chunk, future in futures:
+        try:
+            fetched = future.result()
+        except Exception as e:
+            if errors is None:
+                raise
+            errors.update(dict.fromkeys(chunk, f"Album lookup failed: {e}"))
+            continue
+        for id, album in fetched.items():
+            album_cache.set(id, album)
+        albums.update(fetched)
+    return albums
 
-        artist_name = response.json()['artists'][0]['name']
 
-        cover_url = response.json()['images'][0]['url']
+def getAlbumInfo(id):
+    """Return the get-info response body: the album record, or a structured error."""
+    album_info = fetchAlbumInfo(id)
+    if album_info is None:
+        return {"error": {"message": "No results found.", "query": id}}
 
-        # extract the list of songs
-        album = response.json()['tracks']['items']
-        for song in album:
-            tracklist.append(song['name'])
+    return album_info
 
-        # extract the copyright text
-        copyrights = response.json()['copyrights']
-        copyright = copyrights[0]['text']
 
+def getAlbumInfoAsJson(id):
+    return dumps(getAlbumInfo(id))
 
-    else:
-        return json.dumps({"error": {"message": "No results found.", "query": query}})
 
-    album_info = {"album-name":album_name, "artist-name": artist_name, "cover-url": cover_url, "tracklist": tracklist, "copyright": copyright}
+def getPosterAssets(id, bg_color):
+    """Resolve an album and fetch its cover and scannable concurrently, each through its cache.
 
-    return(json.dumps(album_info))
+    Returns (album, cover_bytes, scannable_bytes), or None if the album
+    lookup fails.
+    """
+    album_info = fetchAlbumInfo(id)
+    if album_info is None:
+        return None
+    cover = getExecutor().submit(fetchCover, album_info.cover_url)
+    scannable_bytes = fetchScannable(id, bg_color)
+    return album_info, cover.result(), scannable_bytes
@@ -0,0 +1,40 @@
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def toJsonable(obj):
+    """Fallback for values the encoder does not know, such as search records."""
+    if hasattr(obj, 'toJson'):
+        return obj.toJson()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def loads(data):
+    """Parse JSON from bytes or str, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj):
+    """Serialize to a JSON string, with orjson when it is installed."""
+    if orjson is not None:
+        # Records are dataclasses; let toJsonable pick their wire field names
+        return orjson.dumps(obj, default=toJsonable, option=orjson.OPT_PASSTHROUGH_DATACLASS).decode('utf-8')
+    return json.dumps(obj, default=toJsonable)
+
+
+class RecordJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that serializes records directly, using orjson when available."""
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return loads(s)
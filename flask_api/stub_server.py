@@ -0,0 +1,220 @@
+# Local stand-in for the Spotify accounts, Web API and scannables hosts.
+# usage: python stub_server.py [--port 8081]
+# then point the app at it:
+#   SPOTIFY_ACCOUNTS_URL=http://127.0.0.1:8081/api
+#   SPOTIFY_API_URL=http://127.0.0.1:8081/v1
+#   SCANNABLES_URL=http://127.0.0.1:8081
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image
+
+
+# Real payloads list every market per album and per track, which dominates their size
+MARKETS = [a + b for a in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ' for b in 'ABCDEFG'][:180]
+
+
+def artistFixture(id, base_url):
+    return {
+        'id': f"artist-{id}",
+        'name': f"Artist {id}",
+        'type': 'artist',
+        'uri': f"spotify:artist:artist-{id}",
+        'href': f"{base_url}/v1/artists/artist-{id}",
+        'external_urls': {'spotify': f"https://open.spotify.com/artist/artist-{id}"},
+    }
+
+
+def trackFixture(id, number, base_url):
+    return {
+        'id': f"{id}-{number}",
+        'name': f"Track {number}",
+        'track_number': number,
+        'disc_number': 1,
+        'duration_ms': 180000 + number * 1000,
+        'explicit': False,
+        'type': 'track',
+        'uri': f"spotify:track:{id}-{number}",
+        'href': f"{base_url}/v1/tracks/{id}-{number}",
+        'preview_url': None,
+        'is_local': False,
+        'artists': [artistFixture(id, base_url)],
+        'available_markets': MARKETS,
+        'external_urls': {'spotify': f"https://open.spotify.com/track/{id}-{number}"},
+    }
+
+
+def tracksPageFixture(id, base_url, num_tracks, offset=0, limit=50):
+    """Return one paging object of an album's tracks, with next set while more remain."""
+    end = min(offset + limit, num_tracks)
+    page_url = f"{base_url}/v1/albums/{id}/tracks?offset={{}}&limit={limit}"
+    return {
+        'href': page_url.format(offset),
+        'items': [trackFixture(id, i + 1, base_url) for i in range(offset, end)],
+        'limit': limit,
+        'offset': offset,
+        'total': num_tracks,
+        'next': page_url.format(end) if end < num_tracks else None,
+        'previous': page_url.format(max(0, offset - limit)) if offset else None,
+    }
+
+
+def albumFixture(id, base_url, num_tracks=12):
+    """Return an album payload shaped like GET /v1/albums/{id}, with the first 50 tracks."""
+    return {
+        'id': id,
+        'uri': f"spotify:album:{id}",
+        'name': f"Album {id}",
+        'album_type': 'album',
+        'release_date': '2020-01-01',
+        'label': f"{id} Records",
+        'popularity': 50,
+        'artists': [artistFixture(id, base_url)],
+        'available_markets': MARKETS,
+        'images': [
+            {'url': f"{base_url}/cover/{id}.jpg", 'width': 640, 'height': 640},
+            {'url': f"{base_url}/cover/{id}.jpg", 'width': 300, 'height': 300},
+            {'url': f"{base_url}/cover/{id}.jpg", 'width': 64, 'height': 64},
+        ],
+        'tracks': tracksPageFixture(id, base_url, num_tracks),
+        'copyrights': [{'text': f"(C) {id} Records", 'type': 'C'}, {'text': f"(P) {id} Records", 'type': 'P'}],
+    }
+
+
+def imageBytes(format, size, color):
+    """Encode a flat test image."""
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, format)
+    return buffer.getvalue()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    # Shared across handlers: requests seen per path, for assertions and benchmarks
+    calls = {}
+
+    # Tokens issued so far; any listed in revoked get a 401 from the API
+    tokens_issued = 0
+    revoked = set()
+
+    # path -> list of statuses to answer with before serving normally, and the Retry-After they send
+    failures = {}
+    retry_after = None
+
+    # album id -> number of tracks (default 12), and seconds to wait before each API response
+    track_counts = {}
+    delay = 0
+
+    # album ids the API does not know
+    unknown_ids = set()
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status, body, content_type='application/json', headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        path = urlparse(self.path).path
+        StubHandler.calls[path] = StubHandler.calls.get(path, 0) + 1
+        if path == '/api/token':
+            StubHandler.tokens_issued += 1
+            token = f"stub-token-{StubHandler.tokens_issued}"
+            self.send(200, {'access_token': token, 'token_type': 'Bearer', 'expires_in': 3600})
+        else:
+            self.send(404, {'error': 'not found'})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        StubHandler.calls[url.path] = StubHandler.calls.get(url.path, 0) + 1
+
+        if StubHandler.failures.get(url.path):
+            headers = {'Retry-After': str(StubHandler.retry_after)} if StubHandler.retry_after is not None else None
+            return self.send(StubHandler.failures[url.path].pop(0), {'error': 'stub failure'}, headers=headers)
+
+        if url.path.startswith('/v1/'):
+            token = self.headers.get('Authorization', '').removeprefix('Bearer ')
+            if not token or token in StubHandler.revoked:
+                return self.send(401, {'error': {'status': 401, 'message': 'The access token expired'}})
+
+        if url.path.startswith('/v1/') and StubHandler.delay:
+            time.sleep(StubHandler.delay)
+
+        if url.path == '/v1/albums':
+            # Several albums at once; unknown ids come back as null like upstream
+            ids = query.get('ids', [''])[0].split(',')[:20]
+            albums = [None if id in StubHandler.unknown_ids else albumFixture(id, self.base_url(), StubHandler.track_counts.get(id, 12))
+                      for id in ids]
+            return self.send(200, {'albums': albums})
+
+        match = re.fullmatch(r'/v1/albums/([^/]+)', url.path)
+        if match:
+            id = match.group(1)
+            if id in StubHandler.unknown_ids:
+                return self.send(404, {'error': {'status': 404, 'message': 'Non existing id'}})
+            return self.send(200, albumFixture(id, self.base_url(), StubHandler.track_counts.get(id, 12)))
+
+        match = re.fullmatch(r'/v1/albums/([^/]+)/tracks', url.path)
+        if match:
+            id = match.group(1)
+            offset = int(query.get('offset', ['0'])[0])
+            limit = min(int(query.get('limit', ['20'])[0]), 50)
+            num_tracks = StubHandler.track_counts.get(id, 12)
+            return self.send(200, tracksPageFixture(id, self.base_url(), num_tracks, offset, limit))
+
+        if url.path == '/v1/search':
+            limit = int(query.get('limit', ['8'])[0])
+            items = [albumFixture(f"result{i}", self.base_url()) for i in range(limit)]
+            return self.send(200, {'albums': {'items': items}})
+
+        match = re.fullmatch(r'/cover/([^/]+)\.jpg', url.path)
+        if match:
+            return self.send(200, imageBytes('JPEG', (640, 640), (120, 40, 200)), 'image/jpeg')
+
+        match = re.fullmatch(r'/uri/plain/png/(\w+)/\w+/(\d+)/.+', url.path)
+        if match:
+            size = int(match.group(2))
+            color = '#' + match.group(1)
+            return self.send(200, imageBytes('PNG', (size, size // 4), color), 'image/png')
+
+        self.send(404, {'error': 'not found'})
+
+
+def startStubServer(port=0):
+    """Start the stub server on a background thread and return (server, base_url)."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--delay', type=float, default=0, help='seconds to wait before each API response')
+    args = parser.parse_args()
+    StubHandler.delay = args.delay
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), StubHandler)
+    print(f"Stub server on http://127.0.0.1:{args.port}")
+    server.serve_forever()
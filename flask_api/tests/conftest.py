@@ -0,0 +1,44 @@
+# Tests run against the local stub server (stub_server.py), never the real Spotify hosts.
+# usage: cd flask_api && python -m pytest tests
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_server import StubHandler, startStubServer
+
+# Modules read their upstream URLs and cache directories at import, so both are set before any test imports them
+_server, STUB_URL = startStubServer()
+# Disk tiers go to a directory of this run's own, never one a server on this host reads
+_cache_dir = tempfile.mkdtemp(prefix='poster-tests-')
+atexit.register(shutil.rmtree, _cache_dir, ignore_errors=True)
+os.environ.update(
+    SCANNABLE_CACHE_DIR=os.path.join(_cache_dir, 'scannables'),
+    COVER_CACHE_DIR=os.path.join(_cache_dir, 'covers'),
+    RENDER_CACHE_DIR=os.path.join(_cache_dir, 'renders'),
+    SPOTIFY_ACCOUNTS_URL=f"{STUB_URL}/api",
+    SPOTIFY_API_URL=f"{STUB_URL}/v1",
+    SCANNABLES_URL=STUB_URL,
+    ID='stub-id',
+    SEC='stub-secret',
+    HTTP_BACKOFF='0',
+    HTTP_RETRY_AFTER_MAX='0.1',
+)
+
+
+@pytest.fixture
+def stub():
+    """Reset the stub's counters and fixtures between tests."""
+    StubHandler.calls.clear()
+    StubHandler.failures.clear()
+    StubHandler.track_counts.clear()
+    StubHandler.unknown_ids.clear()
+    StubHandler.revoked.clear()
+    StubHandler.delay = 0
+    StubHandler.retry_after = None
+    yield StubHandler
@@ -0,0 +1,46 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from asgi_app import app
+from render_pool import RenderPool, RenderTimeout
+
+
+def test_poster_does_not_need_executor_threads(stub):
+    """Renders are awaited on the event loop, so they finish while the default executor is busy."""
+    release = threading.Event()
+
+    async def render():
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=1)
+        loop.set_default_executor(executor)
+        blocker = loop.run_in_executor(None, release.wait)
+        try:
+            async with app.test_app() as test_app:
+                response = await asyncio.wait_for(
+                    test_app.test_client().get('/poster?album_id=5bbwyAB9vmqN3uQ7FjRGa1&quality=draft'), 60)
+                return response.status_code, await response.get_data()
+        finally:
+            release.set()
+            await blocker
+
+    status, body = asyncio.run(render())
+
+    assert status == 200
+    assert Image.open(BytesIO(body)).format == 'JPEG'
+
+
+def test_await_result_times_out():
+    pool = RenderPool(workers=1, max_queued=0, timeout=0.001)
+    fields = {'quality': 'draft'}
+
+    async def render():
+        return await pool.awaitResult(pool.submit(fields, b'', b''))
+
+    with pytest.raises(RenderTimeout):
+        asyncio.run(render())
+    assert pool.stats()['timeouts'] == 1
@@ -0,0 +1,26 @@
+import time
+
+import auth
+from search import ACCOUNTS_URL
+
+
+def test_get_token_survives_concurrent_invalidate(stub, monkeypatch):
+    manager = auth.TokenManager(f"{ACCOUNTS_URL}/token", 'ID', 'SEC')
+    token = manager.getToken()
+    monotonic = time.monotonic
+
+    def invalidatingClock():
+        # Another thread's 401 drops the token between the freshness check and the return
+        manager.invalidate(token)
+        return monotonic()
+    monkeypatch.setattr(auth.time, 'monotonic', invalidatingClock)
+
+    assert manager.getToken() == token
+
+
+def test_get_token_refreshes_after_invalidate(stub):
+    manager = auth.TokenManager(f"{ACCOUNTS_URL}/token", 'ID', 'SEC')
+    token = manager.getToken()
+    manager.invalidate(token)
+
+    assert manager.getToken() not in (None, token)
@@ -0,0 +1,30 @@
+from io import BytesIO
+
+from PIL import Image
+
+from app import app
+
+
+def test_poster_from_album_id(stub):
+    response = app.test_client().get('/poster?album_id=4aawyAB9vmqN3uQ7FjRGa1&quality=draft')
+
+    assert response.status_code == 200
+    assert response.mimetype.startswith('image/')
+    assert Image.open(BytesIO(response.data)).format == 'JPEG'
+    assert stub.calls['/v1/albums/4aawyAB9vmqN3uQ7FjRGa1'] == 1
+    assert stub.calls['/cover/4aawyAB9vmqN3uQ7FjRGa1.jpg'] == 1
+
+
+def test_poster_unknown_album_id(stub):
+    stub.unknown_ids.add('4aawyAB9vmqN3uQ7FjRGa2')
+
+    response = app.test_client().get('/poster?album_id=4aawyAB9vmqN3uQ7FjRGa2')
+
+    assert response.status_code == 404
+    assert response.json == {'error': {'message': 'No results found.', 'query': '4aawyAB9vmqN3uQ7FjRGa2'}}
+
+
+def test_poster_without_album_id(stub):
+    response = app.test_client().get('/poster')
+
+    assert response.status_code == 400
@@ -0,0 +1,37 @@
+import zipfile
+from io import BytesIO
+
+from app import app
+
+
+def readArchive(response):
+    assert response.status_code == 200
+    assert response.mimetype == 'application/zip'
+    return zipfile.ZipFile(BytesIO(response.data))
+
+
+def test_posters_archive(stub):
+    ids = ['4aawyAB9vmqN3uQ7FjRGz1', '4aawyAB9vmqN3uQ7FjRGz2', '4aawyAB9vmqN3uQ7FjRGz3']
+    stub.unknown_ids.add(ids[2])
+
+    archive = readArchive(app.test_client().get('/posters?quality=draft&album_ids=' + ','.join(ids + ['not-an-id'])))
+
+    assert archive.namelist() == [f"{ids[0]}.jpg", f"{ids[1]}.jpg", 'errors.txt']
+    assert archive.read('errors.txt').decode('utf-8').splitlines() == [
+        f"{ids[2]}: No results found.",
+        'not-an-id: Invalid album id.',
+    ]
+    # The malformed id never reaches upstream, where it would fail the whole chunk
+    assert stub.calls['/v1/albums'] == 1
+
+
+def test_posters_archive_with_failed_lookup(stub):
+    stub.failures['/v1/albums'] = [400]
+    ids = ['4aawyAB9vmqN3uQ7FjRGy1', '4aawyAB9vmqN3uQ7FjRGy2']
+
+    archive = readArchive(app.test_client().post('/posters?quality=draft', json={'album_ids': ids}))
+
+    assert archive.namelist() == ['errors.txt']
+    errors = archive.read('errors.txt').decode('utf-8').splitlines()
+    assert [line.split(':')[0] for line in errors] == ids
+    assert all('Album lookup failed' in line for line in errors)
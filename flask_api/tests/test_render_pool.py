@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from render_pool import RENDER_PROCESS_BYTES, availableCpus, defaultWorkers
+
+
+@pytest.fixture
+def cgroup(tmp_path, monkeypatch):
+    """An empty cgroup directory on a host with 8 CPUs; tests write the limit files they need."""
+    monkeypatch.setattr(os, 'sched_getaffinity', lambda pid: set(range(8)), raising=False)
+
+    def write(**files):
+        for name, value in files.items():
+            path = tmp_path / name.replace('__', '/')
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(f"{value}\n")
+        return str(tmp_path)
+    return write
+
+
+def test_no_limits_uses_every_cpu(cgroup):
+    assert defaultWorkers(cgroup()) == 8
+
+
+@pytest.mark.parametrize('files, cpus', [
+    ({'cpu.max': 'max 100000'}, 8),
+    ({'cpu.max': '250000 100000'}, 3),
+    ({'cpu__cpu.cfs_quota_us': '-1', 'cpu__cpu.cfs_period_us': '100000'}, 8),
+    ({'cpu__cpu.cfs_quota_us': '200000', 'cpu__cpu.cfs_period_us': '100000'}, 2),
+])
+def test_cpu_quota_caps_cpus(cgroup, files, cpus):
+    assert availableCpus(cgroup(**files)) == cpus
+
+
+@pytest.mark.parametrize('files, workers', [
+    ({'memory.max': 'max'}, 8),
+    ({'memory.max': 3 * RENDER_PROCESS_BYTES}, 3),
+    ({'memory.max': RENDER_PROCESS_BYTES // 2}, 1),
+    ({'memory__memory.limit_in_bytes': 9223372036854771712}, 8),
+    ({'memory__memory.limit_in_bytes': 2 * RENDER_PROCESS_BYTES}, 2),
+])
+def test_memory_limit_caps_workers(cgroup, files, workers):
+    assert defaultWorkers(cgroup(**files)) == workers
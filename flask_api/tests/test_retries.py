@@ -0,0 +1,37 @@
+import asyncio
+import time
+
+from app import app
+from asgi_app import app as asgi_app
+
+# The stub asks for an hour; conftest caps each wait at HTTP_RETRY_AFTER_MAX (0.1s)
+RETRY_AFTER = 3600
+
+
+def test_retry_after_is_capped(stub):
+    stub.failures['/v1/search'] = [429, 503]
+    stub.retry_after = RETRY_AFTER
+
+    started_at = time.monotonic()
+    response = app.test_client().get('/search?type=search&query=capped-sync&quantity=1')
+
+    assert time.monotonic() - started_at < 5
+    assert response.json['albums'][0]['id'] == 'result0'
+    assert stub.calls['/v1/search'] == 3
+
+
+def test_async_retry_after_is_capped(stub):
+    stub.failures['/v1/search'] = [429, 503]
+    stub.retry_after = RETRY_AFTER
+
+    async def search():
+        async with asgi_app.test_app() as test_app:
+            response = await test_app.test_client().get('/search?type=search&query=capped-async&quantity=1')
+            return await response.get_json()
+
+    started_at = time.monotonic()
+    body = asyncio.run(search())
+
+    assert time.monotonic() - started_at < 5
+    assert body['albums'][0]['id'] == 'result0'
+    assert stub.calls['/v1/search'] == 3
@@ -0,0 +1,15 @@
+from app import app
+
+
+def test_search_without_query(stub):
+    response = app.test_client().get('/search?type=search')
+
+    assert response.status_code == 200
+    assert response.json == {'error': {'message': 'No results found.', 'query': None}}
+    assert '/v1/search' not in stub.calls
+
+
+def test_search_with_query(stub):
+    response = app.test_client().get('/search?type=search&query=blonde&quantity=3')
+
+    assert [album['id'] for album in response.json['albums']] == ['result0', 'result1', 'result2']
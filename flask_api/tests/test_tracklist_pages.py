@@ -0,0 +1,29 @@
+import pytest
+
+from search import fetchAlbums, loadAlbumInfo
+
+# Track count -> tracklist pages fetched after the 50 tracks embedded in the album payload
+TRACK_COUNTS = {237: 4, 100: 1, 5: 0}
+
+
+@pytest.mark.parametrize('num_tracks, pages', TRACK_COUNTS.items())
+def test_load_album_info_fetches_every_page(stub, num_tracks, pages):
+    id = f"paged{num_tracks:0>17}"
+    stub.track_counts[id] = num_tracks
+
+    album = loadAlbumInfo(id)
+
+    assert album.tracklist == [f"Track {number}" for number in range(1, num_tracks + 1)]
+    assert stub.calls.get(f"/v1/albums/{id}/tracks", 0) == pages
+
+
+def test_fetch_albums_fetches_every_page(stub):
+    ids = {f"multi{num_tracks:0>17}": num_tracks for num_tracks in TRACK_COUNTS}
+    stub.track_counts.update(ids)
+
+    albums = fetchAlbums(list(ids))
+
+    assert stub.calls['/v1/albums'] == 1
+    for (id, num_tracks), pages in zip(ids.items(), TRACK_COUNTS.values()):
+        assert albums[id].tracklist == [f"Track {number}" for number in range(1, num_tracks + 1)]
+        assert stub.calls.get(f"/v1/albums/{id}/tracks", 0) == pages
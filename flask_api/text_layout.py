@@ -0,0 +1,153 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from fonts import resizedFont
+
+# Text extents kept per worker, keyed by (font file, size, text)
+MEASURE_CACHE_SIZE = int(os.getenv('MEASURE_CACHE_SIZE', 8192))
+
+# Line height as a multiple of the font size, and the most columns a tracklist may use
+LINE_SPACING = 1.2
+MAX_TRACK_COLUMNS = 3
+
+# Shrink no further than this fraction of the design size; longer text is ellipsized instead
+MIN_SHRINK = 0.5
+
+# Glyph hinting makes widths grow slightly less than linearly with size; leave this much slack
+WIDTH_SLACK = 0.98
+
+ELLIPSIS = '…'
+
+_measurements = OrderedDict()
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+@dataclass(slots=True)
+class TextLine:
+    """One line of text positioned on the poster."""
+    x: int
+    y: int
+    text: str
+
+
+@dataclass(slots=True)
+class TracklistLayout:
+    """A fitted tracklist: the font to draw with and every positioned line."""
+    font: object
+    columns: int
+    lines: list
+
+
+def textBox(font, text):
+    """Return the (left, top, right, bottom) box of text drawn at the origin, memoized."""
+    key = (font.path, font.size, text)
+    with _lock:
+        box = _measurements.get(key)
+        if box is not None:
+            _measurements.move_to_end(key)
+            _stats['hits'] += 1
+            return box
+    box = font.getbbox(text)
+    with _lock:
+        _stats['misses'] += 1
+        _measurements[key] = box
+        while len(_measurements) > MEASURE_CACHE_SIZE:
+            _measurements.popitem(last=False)
+    return box
+
+
+def textWidth(font, text):
+    left, _, right, _ = textBox(font, text)
+    return right - left
+
+
+def fittingSize(size, width, max_width):
+    """Largest size at most size at which text measuring width at size fits in max_width."""
+    if width <= max_width:
+        return size
+    return max(1, math.floor(size * max_width * WIDTH_SLACK / width))
+
+
+def ellipsize(font, text, max_width):
+    """Return text cut at a character boundary with an ellipsis so it fits max_width."""
+    if textWidth(font, text) <= max_width:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if textWidth(font, text[:middle].rstrip() + ELLIPSIS) <= max_width:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low].rstrip() + ELLIPSIS
+
+
+def fitText(font, text, max_width):
+    """Return (font, text) shrunk, then if need be ellipsized, to fit max_width."""
+    size = max(fittingSize(font.size, textWidth(font, text), max_width), math.ceil(font.size * MIN_SHRINK))
+    if size != font.size:
+        font = resizedFont(font, size)
+    return font, ellipsize(font, text, max_width)
+
+
+def rowSpacing(start_y, end_y, rows, margin, short_rows):
+    """Return (row spacing, first row y); lists under short_rows rows are pulled in from both ends."""
+    if rows < short_rows:
+        extra_margin = (short_rows - rows) * margin
+        start_y += extra_margin // 2
+        end_y -= extra_margin // 2
+    return (end_y - start_y) // rows, start_y
+
+
+def layoutTracklist(tracklist, font, x, start_y, end_y, width, margin, gutter, short_rows):
+    """Fit a tracklist into a box in one pass.
+
+    Every track is measured once at the design size. Since widths scale with
+    the font size, the largest size that fits is computed directly for 1 to
+    MAX_TRACK_COLUMNS columns, and the column count allowing the largest text
+    wins (fewer columns on a tie). Tracks still too wide at the minimum size
+    are ellipsized.
+    """
+    if not tracklist:
+        return TracklistLayout(font, 1, [])
+
+    widest = max(textWidth(font, track) for track in tracklist)
+    min_size = math.ceil(font.size * MIN_SHRINK)
+    best = None
+    for columns in range(1, MAX_TRACK_COLUMNS + 1):
+        rows = math.ceil(len(tracklist) / columns)
+        if columns > 1 and rows == math.ceil(len(tracklist) / (columns - 1)):
+            continue
+        column_width = (width - gutter * (columns - 1)) // columns
+        spacing, _ = rowSpacing(start_y, end_y, rows, margin, short_rows)
+        # Rows must not overlap; width can give way to ellipsis below the minimum size
+        width_size = max(fittingSize(font.size, widest, column_width), min_size)
+        size = max(1, min(font.size, math.floor(spacing / LINE_SPACING), width_size))
+        if best is None or size > best[0]:
+            best = (size, columns, rows, column_width)
+
+    size, columns, rows, column_width = best
+    if size != font.size:
+        font = resizedFont(font, size)
+    spacing, first_y = rowSpacing(start_y, end_y, rows, margin, short_rows)
+
+    lines = []
+    for i, track in enumerate(tracklist):
+        column, row = divmod(i, rows)
+        lines.append(TextLine(x + column * (column_width + gutter), first_y + row * spacing,
+                              ellipsize(font, track, column_width)))
+    return TracklistLayout(font, columns, lines)
+
+
+def clearMeasurements():
+    with _lock:
+        _measurements.clear()
+
+
+def measureCacheStats():
+    """Return hit/miss counters and the number of memoized measurements."""
+    return {'hits': _stats['hits'], 'misses': _stats['misses'], 'size': len(_measurements)}
@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Optional shared backend so every gunicorn worker sees the same entries
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
+
+_redis_client = None
+
+
+def getRedis():
+    """Return the shared Redis client, or None when no backend is configured."""
+    global _redis_client
+    if _redis_client is None and CACHE_REDIS_URL:
+        if redis is None:
+            raise RuntimeError("CACHE_REDIS_URL is set but the redis package is not installed")
+        _redis_client = redis.Redis.from_url(CACHE_REDIS_URL)
+    return _redis_client
+
+
+class TTLCache:
+    """In-process LRU of values that expire after ttl seconds.
+
+    Backed by Redis when CACHE_REDIS_URL is set, with encode/decode turning
+    values into JSON-serializable data and back. getOrLoad coalesces
+    concurrent misses for the same key into a single loader call.
+    """
+
+    def __init__(self, name, ttl, max_entries, backend=None, encode=None, decode=None):
+        self.name = name
+        self.encode = encode or (lambda value: value)
+        self.decode = decode or (lambda data: data)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.backend = backend if backend is not None else getRedis()
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.backend_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _backendKey(self, key):
+        return f"poster:{self.name}:{key}"
+
+    def _getLocal(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _setLocal(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached value for key, or None."""
+        value = self._getLocal(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        if self.backend is not None:
+            try:
+                raw = self.backend.get(self._backendKey(key))
+            except Exception as e:
+                print(f"Cache backend error: {e}")
+                raw = None
+            if raw is not None:
+                entry = json.loads(raw)
+                value = self.decode(entry['value'])
+                # Keep it locally for no longer than the backend would
+                self._setLocal(key, value, entry['expires_at'] - time.time())
+                self.backend_hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        """Store a value under key locally and in the shared backend."""
+        self._setLocal(key, value, self.ttl)
+        if self.backend is not None:
+            try:
+                entry = {'expires_at': time.time() + self.ttl, 'value': self.encode(value)}
+                self.backend.setex(self._backendKey(key), self.ttl, json.dumps(entry))
+            except Exception as e:
+                print(f"Cache backend error: {e}")
+
+    def getOrLoad(self, key, loader):
+        """Return the cached value, or call loader() once for all concurrent callers.
+
+        None results are handed to waiting callers but never cached.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if not leader:
+            self.coalesced += 1
+            return future.result()
+
+        try:
+            value = loader()
+            if value is not None:
+                self.set(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def stats(self):
+        """Return hit/miss counters and the number of local entries."""
+        return {
+            'hits': self.hits,
+            'backend_hits': self.backend_hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'entries': len(self._entries),
+            'ttl': self.ttl,
+        }
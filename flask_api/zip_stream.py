@@ -0,0 +1,46 @@
+import time
+import zipfile
+
+
+class _ChunkWriter:
+    """Write-only, unseekable file object that hands back whatever was written since the last take()."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ZipStream:
+    """Builds a ZIP archive incrementally, returning its bytes as each file is added.
+
+    Only the file being added is held in memory; the archive is never seeked,
+    so its bytes can go straight to a response. Members are stored
+    uncompressed since posters are already compressed images.
+    """
+
+    def __init__(self):
+        self._writer = _ChunkWriter()
+        self._zip = zipfile.ZipFile(self._writer, mode='w', compression=zipfile.ZIP_STORED)
+
+    def add(self, name, data):
+        """Add a file and return the archive bytes it produced."""
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_STORED
+        self._zip.writestr(info, data)
+        return self._writer.take()
+
+    def close(self):
+        """Finish the archive and return its trailing bytes (the central directory)."""
+        self._zip.close()
+        return self._writer.take()
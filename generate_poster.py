@@ -1,29 +1,10 @@
 from PIL import Image, ImageDraw, ImageFont
-import math
-
-def color_distance(c1, c2):
-    # Calculate Euclidean distance between two RGB colors
-    return math.sqrt(sum((a - b) ** 2 for a, b in zip(c1, c2)))
+from palette import extractPalette
 
 def hexToRGB(hex_color):
     hex_color = hex_color.lstrip('#')  # Remove '#' if it's present
     return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
 
-def pick_distinct_colors(palette, num_colors):
-    # Extract RGB tuples from the palette
-    colors = [(palette[i], palette[i+1], palette[i+2]) for i in range(0, len(palette), 3)]
-    
-    # Start with the first color
-    selected_colors = [colors[0]]
-    
-    for _ in range(1, num_colors):
-        next_color = max(colors, key=lambda c: min(color_distance(c, sc) for sc in selected_colors))
-        selected_colors.append(next_color)
-        colors.remove(next_color)
-    
-    return selected_colors
-
-
 def resizeAndPasteImage(image, poster, size, position):
     """Resize the image and paste it onto the poster."""
     img_resized = image.resize(size)
@@ -80,9 +61,7 @@ def generatePoster(bg_color, image, album_name, artist_name, tracklist, scannabl
     drawLines(draw, [70, 3450])
 
     # Generate color palette
-    paletted = image.convert('P', palette=Image.ADAPTIVE, colors=20)
-    palette = paletted.getpalette()
-    distinct_colors = pick_distinct_colors(palette, 5)
+    distinct_colors = extractPalette(image, num_colors=5, palette_size=20)
 
     # Draw color palette
     drawColorPalette(draw, distinct_colors, start_x=1240, start_y=2400, block_width=210, block_height=40)
@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+from PIL import Image, features
+
+# Palettes are extracted from a thumbnail no larger than this on its longest side
+PALETTE_MAX_SIZE = int(os.getenv('PALETTE_MAX_SIZE', 256))
+
+# 'libimagequant', 'fastoctree' or 'mediancut'; libimagequant falls back to
+# mediancut (the quantizer the full-size path used) when Pillow lacks it
+PALETTE_QUANTIZER = os.getenv('PALETTE_QUANTIZER', 'libimagequant')
+
+_QUANTIZERS = {
+    'mediancut': Image.Quantize.MEDIANCUT,
+    'fastoctree': Image.Quantize.FASTOCTREE,
+    'libimagequant': Image.Quantize.LIBIMAGEQUANT,
+}
+
+# sRGB (D65) to XYZ, used by the perceptual 'lab' distance mode
+_RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+_D65_WHITE = np.array([0.95047, 1.0, 1.08883])
+
+
+def rgbToLab(colors):
+    """Convert an (n, 3) array of 8-bit RGB colours to CIE Lab."""
+    rgb = np.asarray(colors, dtype=np.float64) / 255.0
+    linear = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    xyz = (linear @ _RGB_TO_XYZ.T) / _D65_WHITE
+    f = np.where(xyz > 216 / 24389, np.cbrt(xyz), (24389 / 27 * xyz + 16) / 116)
+    return np.stack([
+        116 * f[:, 1] - 16,
+        500 * (f[:, 0] - f[:, 1]),
+        200 * (f[:, 1] - f[:, 2]),
+    ], axis=1)
+
+
+def usedPaletteColors(paletted):
+    """Return the (n, 3) RGB entries a 'P' image actually uses, in palette order."""
+    palette = np.array(paletted.getpalette(), dtype=np.uint8).reshape(-1, 3)
+    used = sorted(index for _, index in paletted.getcolors(len(palette)))
+    return palette[used]
+
+
+def pickDistinctColors(colors, num_colors, mode='rgb'):
+    """Greedy farthest-point pick of num_colors from an (n, 3) RGB array.
+
+    Starts from the first colour and repeatedly adds the colour whose distance
+    to its nearest already-picked colour is largest. mode is 'rgb' for
+    Euclidean RGB distance or 'lab' for perceptual (CIE76) distance.
+    """
+    colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 3)
+    if mode == 'lab':
+        points = rgbToLab(colors)
+    elif mode == 'rgb':
+        points = colors.astype(np.float64)
+    else:
+        raise ValueError(f"Unknown palette mode: {mode}")
+
+    # Squared distance of every colour to its nearest picked colour
+    selected = [0]
+    nearest = ((points - points[0]) ** 2).sum(axis=1)
+    for _ in range(1, num_colors):
+        index = int(nearest.argmax())
+        selected.append(index)
+        nearest = np.minimum(nearest, ((points - points[index]) ** 2).sum(axis=1))
+
+    return [tuple(int(c) for c in colors[i]) for i in selected]
+
+
+def quantizeMethod(quantizer=None):
+    """Resolve a quantizer name to a Pillow method."""
+    quantizer = quantizer or PALETTE_QUANTIZER
+    if quantizer not in _QUANTIZERS:
+        raise ValueError(f"Unknown quantizer: {quantizer}")
+    if quantizer == 'libimagequant' and not features.check('libimagequant'):
+        quantizer = 'mediancut'
+    return _QUANTIZERS[quantizer]
+
+
+def paletteThumbnail(image, max_size=None):
+    """Return the image as RGB, scaled down to at most max_size on its longest side."""
+    max_size = max_size or PALETTE_MAX_SIZE
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    scale = max(image.size) / max_size
+    if scale > 1:
+        size = (max(1, round(image.width / scale)), max(1, round(image.height / scale)))
+        image = image.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+    return image
+
+
+def extractPalette(image, num_colors=5, palette_size=20, mode='rgb', max_size=None, quantizer=None):
+    """Quantize a thumbnail of the image to palette_size colours and pick num_colors distinct ones."""
+    thumbnail = paletteThumbnail(image, max_size)
+    paletted = thumbnail.quantize(palette_size, method=quantizeMethod(quantizer))
+    return pickDistinctColors(usedPaletteColors(paletted), num_colors, mode)
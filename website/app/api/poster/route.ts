@@ -6,6 +6,9 @@ const client_url = 'https://posteroven.vercel.app';
 export async function GET(request: Request): Promise<Response> {
   const { searchParams } = new URL(request.url);
   const sessionId = searchParams.get('id');
+  const quality = searchParams.get('quality') || 'final';
+  const format = searchParams.get('format') || 'jpeg';
+  const layout = searchParams.get('layout') || 'a4';
 
   if (!sessionId) {
     return NextResponse.json({ error: 'Session ID required' }, { status: 400 });
@@ -39,26 +42,34 @@ export async function GET(request: Request): Promise<Response> {
       throw new Error(`Failed to get scannable: ${scannableResponse.error}`);
     }
 
-    // Convert image data to base64
-    const imageBase64 = Buffer.from(imageData).toString('base64');
-    const scannableBase64 = Buffer.from(scannableResponse.data).toString('base64');
-
-    // Make POST request to Flask endpoint with data in body
-    const posterResponse = await fetch('https://harsh-myriam-posteroven-366b0757.koyeb.app/poster', {
+    // Send the images as binary multipart parts rather than base64 in JSON
+    const form = new FormData();
+    form.append('album_name', album_data.album_name);
+    form.append('artist_name', album_data.artist_name);
+    form.append('tracklist', JSON.stringify(album_data.tracklist || []));
+    form.append('copyright_text', album_data.copyright_text || '');
+    form.append('scannable', new Blob([scannableResponse.data], { type: 'image/png' }), 'scannable.png');
+    form.append('image', new Blob([imageData]), 'cover');
+
+    // Pass the browser's cached ETag on so an unchanged poster comes back as a bodiless 304
+    const ifNoneMatch = request.headers.get('If-None-Match');
+    const posterResponse = await fetch(`https://harsh-myriam-posteroven-366b0757.koyeb.app/poster?quality=${quality}&format=${format}&layout=${layout}&session=${encodeURIComponent(sessionId)}`, {
       method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify({
-        album_name: album_data.album_name,
-        artist_name: album_data.artist_name,
-        tracklist: album_data.tracklist || '',
-        copyright_text: album_data.copyright_text || '',
-        scannable: scannableBase64,
-        image: imageBase64
-      })
+      body: form,
+      headers: ifNoneMatch ? { 'If-None-Match': ifNoneMatch } : undefined
     });
 
+    // no-cache lets the browser keep the poster but makes it revalidate with its ETag every time
+    const headers: Record<string, string> = { 'Cache-Control': 'no-cache' };
+    const etag = posterResponse.headers.get('ETag');
+    if (etag) {
+      headers['ETag'] = etag;
+    }
+
+    if (posterResponse.status === 304) {
+      return new Response(null, { status: 304, headers });
+    }
+
     if (!posterResponse.ok) {
       const errorText = await posterResponse.text();
       throw new Error(`Failed to generate poster: ${errorText}`);
@@ -70,9 +81,9 @@ export async function GET(request: Request): Promise<Response> {
     // Return the poster image
     return new Response(posterData, {
       headers: {
-        'Content-Type': 'image/jpeg',
+        ...headers,
+        'Content-Type': posterResponse.headers.get('Content-Type') || 'image/jpeg',
         'Content-Length': Buffer.byteLength(posterData).toString(),
-        'Cache-Control': 'no-cache',
       },
     });
 
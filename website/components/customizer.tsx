@@ -130,7 +130,7 @@ export default function Customizer() {
     const handleDownloadPoster = async () => {
         if (!posterData) return;
 
-        const posterUrl = `/api/poster?id=${params.sessionId}&t=${updateTimestamp}`;
+        const posterUrl = `/api/poster?id=${params.sessionId}&quality=final&t=${updateTimestamp}`;
         try {
             const response = await fetch(posterUrl);
             if (!response.ok) {
@@ -140,9 +140,11 @@ export default function Customizer() {
             const blob = await response.blob();
             const url = window.URL.createObjectURL(blob);
 
+            // Name the file after the format the API actually returned
+            const extension = blob.type === 'image/jpeg' ? 'jpg' : blob.type.split('/')[1] || 'jpg';
             const link = document.createElement('a');
             link.href = url;
-            link.download = `${posterData.album_name} - Poster.png`; // File name
+            link.download = `${posterData.album_name} - Poster.${extension}`; // File name
             document.body.appendChild(link);
             link.click();
             document.body.removeChild(link);
@@ -194,7 +196,7 @@ export default function Customizer() {
                         )}
                         <div className="relative w-full h-[calc(100vh-8rem)] flex items-center justify-center overflow-hidden rounded-2xl">
                             <Image
-                                src={`/api/poster?id=${params.sessionId}&t=${updateTimestamp}`}
+                                src={`/api/poster?id=${params.sessionId}&quality=preview&t=${updateTimestamp}`}
                                 alt={posterData.album_name}
                                 fill
                                 style={{ objectFit: 'contain', borderRadius: '1rem' }}
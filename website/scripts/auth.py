@@ -0,0 +1,71 @@
+import base64
+import os
+import threading
+import time
+
+import requests
+
+
+class TokenManager:
+    """Client-credentials access token cached until shortly before it expires.
+
+    One caller refreshes the token under a lock while concurrent callers wait
+    for it, and authorizedGet retries once with a fresh token on a 401.
+    """
+
+    def __init__(self, token_url, id_var, secret_var, session=None, refresh_margin=60):
+        self.token_url = token_url
+        self.id_var = id_var
+        self.secret_var = secret_var
+        self.session = session or requests
+        self.refresh_margin = refresh_margin
+        self._token = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+
+    def _fetchToken(self):
+        auth_string = os.getenv(self.id_var) + ":" + os.getenv(self.secret_var)
+        auth_base64 = str(base64.b64encode(auth_string.encode("utf-8")), "utf-8")
+        headers = {
+            "Authorization": "Basic " + auth_base64,
+            "Content-Type": "application/x-www-form-urlencoded"
+        }
+        data = {"grant_type": "client_credentials"}
+        result = self.session.post(self.token_url, headers=headers, data=data)
+
+        if result.status_code != 200:
+            print(f"Error: {result.status_code}, result: {result.text}")
+            result.raise_for_status()
+
+        json_result = result.json()
+        self._token = json_result['access_token']
+        self._expires_at = time.monotonic() + json_result.get('expires_in', 3600) - self.refresh_margin
+
+    def getToken(self):
+        """Return a valid access token, refreshing it at most once across threads."""
+        # Read once: another thread's invalidate() can reset self._token at any point
+        token = self._token
+        if token is not None and time.monotonic() < self._expires_at:
+            return token
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if self._token is None or time.monotonic() >= self._expires_at:
+                self._fetchToken()
+            return self._token
+
+    def invalidate(self, token):
+        """Drop the cached token if it is still the one that was rejected."""
+        with self._lock:
+            if self._token == token:
+                self._token = None
+
+    def authorizedGet(self, url, **kwargs):
+        """GET with a bearer token, retrying once with a new token on 401."""
+        headers = kwargs.pop('headers', None) or {}
+        for _ in range(2):
+            token = self.getToken()
+            response = self.session.get(url, headers=dict(headers, Authorization="Bearer " + token), **kwargs)
+            if response.status_code != 401:
+                break
+            self.invalidate(token)
+        return response
@@ -0,0 +1,81 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Connections kept alive per host, and threads used for concurrent downloads
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 16))
+HTTP_FETCH_WORKERS = int(os.getenv('HTTP_FETCH_WORKERS', 8))
+
+# Seconds to wait for a connection and for each read
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 3.05))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 10))
+
+# Retries on connection errors, 429 and 5xx, sleeping backoff * 2^n between tries
+# (or whatever Retry-After asks for, up to HTTP_RETRY_AFTER_MAX seconds)
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', 3))
+HTTP_BACKOFF = float(os.getenv('HTTP_BACKOFF', 0.25))
+HTTP_RETRY_AFTER_MAX = float(os.getenv('HTTP_RETRY_AFTER_MAX', 5))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session = None
+_executor = None
+_lock = threading.Lock()
+
+
+class CappedRetry(Retry):
+    """Retry that waits at most HTTP_RETRY_AFTER_MAX seconds, whatever Retry-After asks for."""
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(retry_after, HTTP_RETRY_AFTER_MAX)
+
+
+class PooledSession(requests.Session):
+    """Session that applies the default timeouts to every request."""
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+        return super().request(method, url, **kwargs)
+
+
+def getSession():
+    """Return the shared keep-alive session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = PooledSession()
+                retry = CappedRetry(
+                    total=HTTP_RETRIES,
+                    backoff_factor=HTTP_BACKOFF,
+                    status_forcelist=RETRY_STATUSES,
+                    allowed_methods=frozenset(['GET', 'POST']),
+                    # Hand the last response back so callers see the real status
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def getExecutor():
+    """Return the shared thread pool used for concurrent downloads."""
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=HTTP_FETCH_WORKERS, thread_name_prefix='http')
+    return _executor
+
+
+def fetchBytes(url, **kwargs):
+    """GET a URL through the shared session and return the body, raising on HTTP errors."""
+    response = getSession().get(url, **kwargs)
+    response.raise_for_status()
+    return response.content
@@ -1,47 +1,30 @@
 # search_script.py
 
-import base64
 import json
-import os
 import sys
 from dotenv import load_dotenv
-from requests import post, get
+from auth import TokenManager
+from http_client import getSession
+
+load_dotenv()
+
+# One cached access token for the whole process
+token_manager = TokenManager("https://accounts.spotify.com/api/token", 'CLIENT_ID', 'CLIENT_SECRET', session=getSession())
 
 def debug(message):
     print(f"DEBUG: {message}", file=sys.stderr)
 
 
 def getToken():
-    load_dotenv()
-    debug(os.getenv('CLIENT_ID'))
-    debug(os.getenv('TEST'))
-    auth_string = os.getenv('CLIENT_ID') + ":" + os.getenv('CLIENT_SECRET')
-    auth_bytes = auth_string.encode("utf-8")
-    auth_base64 = str(base64.b64encode(auth_bytes), "utf-8")
-
-    url = "https://accounts.spotify.com/api/token"
-    headers = {
-        "Authorization": "Basic " + auth_base64,
-        "Content-Type": "application/x-www-form-urlencoded"
-    }
-
-    data = {"grant_type": "client_credentials"}
-    result = post(url, headers=headers, data=data)
-
-    if result.status_code == 200:
-        return result.json()['access_token']
-    else:
-        print(f"Error: {result.status_code}, result: {result.text}")
-        result.raise_for_status()
+    return token_manager.getToken()
 
 def getAuthHeader(token):
     return {"Authorization": "Bearer " + token}
 
-def search(token, type, input, limit):
+def search(type, input, limit):
     url = 'https://api.spotify.com/v1/search'
-    headers = getAuthHeader(token)
     query = f"?q={input}&type={type}&limit={limit}"
-    result = get(url + query, headers=headers)
+    result = token_manager.authorizedGet(url + query)
     
     if result.status_code == 200:
         json_result = result.json()[type+'s']['items']
@@ -60,8 +43,7 @@ def getImages(search_result):
     return [result['images'][0]['url'] for result in search_result if result['images']]
 
 def getSearchResultAsJson(query, limit=8):
-    token = getToken()
-    search_result = search(token, 'album', query, limit)
+    search_result = search('album', query, limit)
     
     if search_result:
         albums_data = []
@@ -89,11 +71,8 @@ def getAlbumInfo(id):
     tracklist = []
     copyright = ''
 
-    token = getToken()
-        
     url = f"https://api.spotify.com/v1/albums/{id}"
-    headers = getAuthHeader(token)
-    response = get(url, headers=headers)
+    response = token_manager.authorizedGet(url)
 
     if response.status_code == 200:
         album_name = response.json()['name']